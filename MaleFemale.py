@@ -3,12 +3,21 @@
 
 """
 Модель, использующая лингвистические признаки для выявления преобладающего рода во фрагменте текста
+
+Слова-признаки (в т.ч. из нескольких слов, например "двоюродный брат") компилируются в префиксное дерево
+по словам, которое просматривается вдоль потока лексем предложения. В каждой позиции берется самое
+длинное совпадение, поэтому "двоюродный брат" считается одним признаком, а не двумя.
+
+analyze_corpus применяет модель ко всему корпусу (HTMLCorpusReader или PickledCorpusReader), распределяя
+документы по процессам, и возвращает счетчики по документам, категориям и корпусу в целом.
 """
 
 from collections import Counter
+from functools import partial
 import nltk
-import urllib
 from bs4 import BeautifulSoup
+from classes.ArticleFetcher import ArticleFetcher
+from classes.Parallel import imap
 
 # Классификаторы предложений
 MALE = 'male'  # речь только о мужчинах идет
@@ -28,14 +37,65 @@ FEMALE_WORDS = {'она', 'девочка', 'девушка', 'женщина',
                 'ученица'}
 
 
-def genderize(words):
+class GenderMatcher(object):
+
+    """Скомпилированный поиск слов-признаков (одно- и многословных) в списке лексем"""
+
+    def __init__(self, male_words=MALE_WORDS, female_words=FEMALE_WORDS):
+        # Узел дерева - словарь: слово -> следующий узел, а по ключу None - род, если на узле заканчивается признак
+        self.trie = {}
+        for gender, phrases in ((MALE, male_words), (FEMALE, female_words)):
+            for phrase in phrases:
+                node = self.trie
+                for word in phrase.split():
+                    node = node.setdefault(word, {})
+                node[None] = gender
+
+    def count(self, words):
+        """Возвращает Counter числа найденных признаков каждого рода в списке лексем words"""
+
+        trie = self.trie
+        counts = Counter()
+        i, n = 0, len(words)
+
+        while i < n:
+            node = trie.get(words[i])
+            if node is None:
+                i += 1
+                continue
+
+            # Идем по дереву, запоминая самое длинное совпадение
+            gender, end, j = node.get(None), i + 1, i + 1
+            while j < n:
+                node = node.get(words[j])
+                if node is None:
+                    break
+                j += 1
+                if None in node:
+                    gender, end = node[None], j
+
+            if gender is None:
+                i += 1
+            else:
+                counts[gender] += 1
+                i = end
+
+        return counts
+
+
+# Общий поиск по словам-признакам модуля
+MATCHER = GenderMatcher()
+
+
+def genderize(words, matcher=MATCHER):
     """
     Принимает на вход предложение из слов.
     Подсчитывает кол-во вхождений слов из вышезаданных классификаторов в предложении.
     Возвращает  классификатор предложения
     """
-    male_words_len = len(MALE_WORDS.intersection(words))
-    female_words_len = len(FEMALE_WORDS.intersection(words))
+    counts = matcher.count(words)
+    male_words_len = counts[MALE]
+    female_words_len = counts[FEMALE]
 
     if male_words_len > 0 and female_words_len == 0:
         return MALE
@@ -47,7 +107,7 @@ def genderize(words):
         return UNKNOWN
 
 
-def count_gender(sentences):
+def count_gender(sentences, matcher=MATCHER):
     """
     Принимает на вход список предложений.
     Использует genderize для классификации предложения и для определения общего кол-ва слов признаков.
@@ -58,9 +118,9 @@ def count_gender(sentences):
     words = Counter()
 
     for sentence in sentences:
-        gender = genderize(sentence)
+        gender = genderize(sentence, matcher)
         sents[gender] += 1
-        words[gender] += len(sentences)
+        words[gender] += len(sentence)
 
     return sents, words
 
@@ -85,12 +145,77 @@ def parse_gender(text):
         print('%s %s (%s sentences)' % (pcent, gender, nsents))
 
 
+def document_sentences(reader, fileid):
+    """
+    Генератор предложений документа в виде списков лексем в нижнем регистре.
+
+    HTMLCorpusReader возвращает предложения строками - они разбиваются на лексемы word_tokenize,
+    PickledCorpusReader - списками пар (token, tag).
+    """
+
+    for sentence in reader.sents(fileids=fileid):
+        if isinstance(sentence, str):
+            yield [word.lower() for word in nltk.word_tokenize(sentence)]
+        else:
+            yield [token.lower() for token, tag in sentence]
+
+
+def analyze_document(reader, fileid, matcher=MATCHER):
+    """Возвращает (fileid, счетчик предложений по родам, счетчик слов по родам) одного документа"""
+
+    sents, words = count_gender(document_sentences(reader, fileid), matcher)
+    return fileid, sents, words
+
+
+def analyze_corpus(reader, fileids=None, categories=None, n_jobs=None, chunksize=16, matcher=MATCHER):
+    """
+    Определяет род предложений всех документов корпуса.
+
+    reader - HTMLCorpusReader или PickledCorpusReader. При n_jobs > 1 документы обрабатываются в пуле
+    процессов порциями по chunksize (см. classes.Parallel.imap).
+
+    Возвращает словарь:
+    documents - fileid -> {'sents': {род: число предложений}, 'words': {род: число слов}},
+    categories - те же счетчики, просуммированные по категориям,
+    total - те же счетчики по всему корпусу.
+    """
+
+    fileids = reader.resolve(fileids, categories) or reader.fileids()
+    if isinstance(fileids, str):
+        fileids = [fileids]
+
+    documents = {}
+    by_category = {}
+    total = {'sents': Counter(), 'words': Counter()}
+
+    results = imap(partial(analyze_document, reader, matcher=matcher), fileids, n_jobs, chunksize, ordered=False)
+    for fileid, sents, words in results:
+        documents[fileid] = {'sents': dict(sents), 'words': dict(words)}
+
+        for counters in [total] + [
+            by_category.setdefault(category, {'sents': Counter(), 'words': Counter()})
+            for category in reader.categories(fileids=fileid)
+        ]:
+            counters['sents'].update(sents)
+            counters['words'].update(words)
+
+    return {
+        'documents': documents,
+        'categories': {
+            category: {name: dict(counter) for name, counter in counters.items()}
+            for category, counters in by_category.items()
+        },
+        'total': {name: dict(counter) for name, counter in total.items()},
+    }
+
+
 def get_esquire_article():
     """
     Спаршивает статью
     """
     url = "https://esquire.ru/articles/181453-kto-takoy-viktor-stolbun-i-kak-emu-udalos-osnovat-vliyatelnuyu-sektu-v-kotoroy-sostoyal-eduard-uspenskiy-i-gde-praktikovali-nasilie-i-lzhenauku/#part1"
-    page = urllib.request.urlopen(url).read().decode("utf-8")
+    with ArticleFetcher(timeout=30) as fetcher:
+        page = fetcher.get(url)
     soup = BeautifulSoup(page, "html.parser")
     text = soup.find("div", {"class": "text-page"}).text
 
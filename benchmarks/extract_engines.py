@@ -0,0 +1,74 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Сравнение способов извлечения абзацев HTMLCorpusReader (engine='bs4' и engine='lxml').
+
+Для каждого документа корпуса абзацы извлекаются обоими способами: проверяется, что результаты
+совпадают, и замеряется время. Каждый документ обрабатывается repeat раз, берется лучшее время.
+
+Тексты сравниваются с точностью до пробельных символов: bs4 разбирает сериализованный readability HTML
+заново, и парсер при этом отбрасывает часть пробельных узлов между блоками, а lxml-дерево их сохраняет.
+На предложения и лексемы это не влияет.
+
+Запуск из корня проекта:
+python benchmarks/extract_engines.py [корень корпуса] [repeat]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classes.CustomCorpusReader import HTMLCorpusReader, ENGINES
+from config import CORPUS_ROOT
+
+
+def best_time(func, repeat):
+    """Возвращает результат func и лучшее время из repeat запусков"""
+
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        secs = time.perf_counter() - started
+        best = secs if best is None else min(best, secs)
+
+    return result, best
+
+
+def squash(paras):
+    """Схлопывает пробельные символы в каждом абзаце"""
+
+    return [' '.join(para.split()) for para in paras]
+
+
+def main(root=CORPUS_ROOT, repeat=3):
+    readers = {engine: HTMLCorpusReader(root, engine=engine) for engine in ENGINES}
+    totals = dict.fromkeys(ENGINES, 0.0)
+    mismatches = 0
+
+    for fileid in readers['bs4'].fileids():
+        results = {}
+        for engine, reader in readers.items():
+            results[engine], secs = best_time(lambda: list(reader.paras(fileids=fileid)), repeat)
+            totals[engine] += secs
+
+        same = squash(results['bs4']) == squash(results['lxml'])
+        mismatches += not same
+        print('{}: {} абзацев, {}'.format(fileid, len(results['bs4']), 'совпадает' if same else 'РАЗЛИЧАЕТСЯ'))
+
+    print()
+    for engine, secs in totals.items():
+        print('{}: {:.3f} с'.format(engine, secs))
+    print('Ускорение: {:.2f}x, расхождений: {}'.format(totals['bs4'] / totals['lxml'], mismatches))
+
+    return mismatches
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    root = args[0] if args else CORPUS_ROOT
+    repeat = int(args[1]) if len(args) > 1 else 3
+    sys.exit(1 if main(root, repeat) else 0)
@@ -0,0 +1,57 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Замер времени импорта модулей проекта.
+
+Каждый модуль импортируется в отдельном свежем процессе с python -X importtime в офлайн-режиме
+(TEXTANALYSIS_OFFLINE=1), чтобы сетевые проверки ресурсов NLTK не могли попасть в замер.
+Выводится полное время импорта модуля и самые тяжелые из импортируемых им пакетов.
+
+Запуск из корня проекта:
+python benchmarks/import_time.py [модуль ...]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ['classes.CustomCorpusReader', 'classes.TextNormalizer']
+
+
+def measure(module, top=5):
+    """Возвращает время импорта module (мс) по -X importtime, время работы процесса (мс) и самые тяжелые пакеты"""
+
+    env = dict(os.environ, TEXTANALYSIS_OFFLINE='1')
+    started = time.time()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True
+    )
+    wall = (time.time() - started) * 1000
+
+    if result.returncode != 0:
+        raise RuntimeError('Не удалось импортировать {}:\n{}'.format(module, result.stderr))
+
+    # Строки вида "import time:  self [us] | cumulative | imported package"
+    packages = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        packages.append((int(cumulative) / 1000, name.rstrip()))
+
+    total = next(ms for ms, name in packages if name.strip() == module)
+    heaviest = sorted((p for p in packages if p[1].strip() != module), reverse=True)[:top]
+
+    return total, wall, heaviest
+
+
+if __name__ == '__main__':
+    for module in sys.argv[1:] or MODULES:
+        total, wall, heaviest = measure(module)
+        print('{}: импорт {:.1f} мс (процесс целиком {:.1f} мс)'.format(module, total, wall))
+        for ms, name in heaviest:
+            print('    {:8.1f} мс {}'.format(ms, name))
@@ -0,0 +1,435 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Набор замеров производительности конвейера: от чтения HTML до векторизации.
+
+Каждый этап запускается в отдельном процессе, поэтому пиковое потребление памяти (ru_maxrss)
+относится только к нему. Для каждого этапа выводятся время, пропускная способность (документов или
+других единиц в секунду и МБ/с) и пиковый RSS. Подготовка данных этапа (например, чтение текстов для
+векторизаторов) в замер времени не входит. Тексты для векторизаторов извлекаются из HTML один раз и
+хранятся в рабочем каталоге (см. extract_texts), этапы читают их потоком.
+
+Этапы, которым нужны отсутствующие ресурсы NLTK (punkt, модель теггера, стоп-слова, WordNet),
+пропускаются - ресурсы не скачиваются, замеры работают без сети. Этапы, зависящие от пропущенного
+этапа (например, чтение обработанного корпуса без Preprocessor), тоже пропускаются.
+
+По умолчанию замер идет на синтетическом корпусе (benchmarks/synthetic.py). Результаты можно сохранить
+в JSON (--save) и сравнить с сохраненными ранее (--baseline): этап считается регрессией, если его
+пропускная способность упала или пиковый RSS вырос больше, чем на --tolerance.
+
+Запуск из корня проекта:
+python benchmarks/suite.py [--size 10mb] [--corpus корень] [--work каталог] [--stages html.paras,...]
+                           [--save результат.json] [--baseline эталон.json] [--tolerance 0.15]
+"""
+
+import argparse
+from collections import OrderedDict
+import hashlib
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TEXTANALYSIS_OFFLINE', '1')
+
+from benchmarks.synthetic import generate
+from classes.Manifest import atomic_open
+from classes.Resources import is_installed
+from classes.Tagger import TAGGER_RESOURCES
+
+TAGGER = TAGGER_RESOURCES['rus']
+
+# Имя этапа -> описание этапа
+STAGES = OrderedDict()
+
+
+def stage(name, resources=(), after=None, prepare=None, output=None):
+    """
+    Регистрирует этап.
+
+    resources - нужные ресурсы NLTK, after - этап, результат которого нужен этому этапу,
+    prepare(ctx) - подготовка данных вне замера, ее результат передается этапу вторым аргументом,
+    output - ключ ctx с каталогом, в который этап пишет результат (для этапов, зависящих от него).
+    Этап возвращает (число обработанных единиц, число обработанных байт или 0).
+    """
+
+    def register(func):
+        STAGES[name] = {'func': func, 'resources': resources, 'after': after, 'prepare': prepare, 'output': output}
+        return func
+
+    return register
+
+
+def html_reader(ctx):
+    from classes.CustomCorpusReader import HTMLCorpusReader
+    return HTMLCorpusReader(ctx['corpus'])
+
+
+def pickled_reader(ctx):
+    from classes.PickledCorpusReader import PickledCorpusReader
+    return PickledCorpusReader(ctx['pickled'])
+
+
+def texts_path(ctx, reader):
+    """
+    Путь к извлеченным текстам корпуса в рабочем каталоге.
+
+    Имя зависит от корня корпуса, а также имени, размера и времени изменения каждого файла, поэтому
+    после изменения корпуса тексты извлекаются заново.
+    """
+
+    digest = hashlib.sha1(os.path.abspath(ctx['corpus']).encode('utf-8'))
+    for fileid, path in zip(reader.fileids(), reader.abspaths()):
+        stat = os.stat(path)
+        digest.update('{}\0{}\0{}\n'.format(fileid, stat.st_size, stat.st_mtime_ns).encode('utf-8'))
+
+    return os.path.join(ctx['work'], 'texts', digest.hexdigest()[:16] + '.jsonl')
+
+
+def extract_texts(ctx):
+    """
+    Извлекает тексты документов (абзацы через перевод строки) один раз на все этапы.
+
+    Тексты пишутся в JSON Lines - по документу на строку - по мере чтения корпуса, поэтому ни корпус,
+    ни тексты целиком в памяти не держатся. Рядом (с суффиксом .meta) сохраняются число документов и
+    размер текстов в байтах utf-8 - он пишется последним и служит признаком завершенного извлечения.
+    Возвращает путь к файлу с текстами.
+    """
+
+    reader = html_reader(ctx)
+    path = texts_path(ctx, reader)
+    if os.path.exists(path + '.meta'):
+        return path
+
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+
+    docs = size = 0
+    with atomic_open(path, 'w', encoding='utf-8') as f:
+        for fileid in reader.fileids():
+            text = '\n'.join(reader.paras(fileids=fileid))
+            f.write(json.dumps(text, ensure_ascii=False) + '\n')
+            docs += 1
+            size += utf8_size(text)
+
+    with atomic_open(path + '.meta', 'w', encoding='utf-8') as f:
+        json.dump({'docs': docs, 'bytes': size}, f)
+
+    return path
+
+
+class TextStream(object):
+
+    """
+    Повторно итерируемый поток текстов из файла extract_texts.
+
+    При каждом обходе файл читается заново, так что векторизаторы, которые обходят корпус дважды
+    (fit и transform), не требуют держать его в памяти. При tokens=True документы отдаются как списки
+    слов в нижнем регистре, без NLTK. size - размер текстов в байтах utf-8.
+    """
+
+    def __init__(self, path, tokens=False):
+        self.path = path
+        self.tokens = tokens
+
+        with open(path + '.meta', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.docs = meta['docs']
+        self.size = meta['bytes']
+
+    def __len__(self):
+        return self.docs
+
+    def __iter__(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                text = json.loads(line)
+                yield text.lower().split() if self.tokens else text
+
+
+def texts(ctx):
+    """Тексты документов для векторизаторов"""
+
+    return TextStream(extract_texts(ctx))
+
+
+def token_lists(ctx):
+    """Документы как списки слов в нижнем регистре"""
+
+    return TextStream(extract_texts(ctx), tokens=True)
+
+
+def count(items, size=len):
+    """Возвращает (число элементов, их общий размер в байтах)"""
+
+    n = total = 0
+    for item in items:
+        n += 1
+        total += size(item)
+
+    return n, total
+
+
+def utf8_size(text):
+    return len(text.encode('utf-8'))
+
+
+@stage('html.docs')
+def html_docs(ctx, _):
+    return count(html_reader(ctx).docs(), utf8_size)
+
+
+@stage('html.html')
+def html_html(ctx, _):
+    return count(html_reader(ctx).html(), utf8_size)
+
+
+@stage('html.paras')
+def html_paras(ctx, _):
+    return count(html_reader(ctx).paras(), utf8_size)
+
+
+@stage('html.sents', resources=('punkt',))
+def html_sents(ctx, _):
+    return count(html_reader(ctx).sents(), utf8_size)
+
+
+@stage('html.words', resources=('punkt',))
+def html_words(ctx, _):
+    return count(html_reader(ctx).words(), utf8_size)
+
+
+@stage('html.tokenize', resources=('punkt', TAGGER))
+def html_tokenize(ctx, _):
+    return count(html_reader(ctx).tokenize(), lambda para: 0)
+
+
+@stage('preprocessor.process', resources=('punkt', TAGGER), output='pickled')
+def preprocessor_process(ctx, _):
+    from classes.Preprocessor import Preprocessor
+
+    reader = html_reader(ctx)
+    preprocessor = Preprocessor(reader, ctx['pickled'], n_jobs=ctx['n_jobs'], incremental=False)
+    n = len(list(preprocessor.transform()))
+    return n, sum(size for _, size in reader.sizes())
+
+
+@stage('pickled.docs', after='preprocessor.process')
+def pickled_docs(ctx, _):
+    return count(pickled_reader(ctx).docs(), lambda doc: 0)
+
+
+@stage('pickled.words', after='preprocessor.process')
+def pickled_words(ctx, _):
+    return count(pickled_reader(ctx).words(), utf8_size)
+
+
+@stage('normalizer.normalize', resources=('stopwords', 'wordnet'), after='preprocessor.process')
+def normalizer_normalize(ctx, _):
+    from classes.TextNormalizer import TextNormalizer
+
+    normalizer = TextNormalizer(n_jobs=ctx['n_jobs'])
+    return count(normalizer.transform(pickled_reader(ctx).docs()))
+
+
+@stage('bow.nltk_tfidf', resources=('punkt',), prepare=texts)
+def bow_nltk_tfidf(ctx, corpus):
+    from classes.BagOfWords import nltk_tfidf_vectorize
+    return count(nltk_tfidf_vectorize(corpus, ctx['n_jobs']), lambda doc: 0)[0], corpus.size
+
+
+@stage('bow.scikit_tfidf', prepare=texts)
+def bow_scikit_tfidf(ctx, corpus):
+    from classes.BagOfWords import scikit_tfidf_vectorize
+    return scikit_tfidf_vectorize(corpus).shape[0], corpus.size
+
+
+@stage('bow.gensim', resources=('punkt',), prepare=texts)
+def bow_gensim(ctx, corpus):
+    from classes.BagOfWords import gensim_vectorize
+    return (count(gensim_vectorize(corpus, ctx['n_jobs'], stream=True), lambda doc: 0)[0], corpus.size)
+
+
+@stage('bow.gensim_tfidf', resources=('punkt',), prepare=texts)
+def bow_gensim_tfidf(ctx, corpus):
+    from classes.BagOfWords import gensim_tfidf_vectorize
+    return (count(gensim_tfidf_vectorize(corpus, ctx['n_jobs'], stream=True), lambda doc: 0)[0], corpus.size)
+
+
+@stage('gensim.vectorizer', prepare=token_lists)
+def gensim_vectorizer(ctx, documents):
+    from classes.GensimVectorizer import GensimVectorizer
+
+    vectorizer = GensimVectorizer(os.path.join(ctx['work'], 'gensim.dict'), output='sparse')
+    matrix = vectorizer.fit(documents).transform(documents)
+    return matrix.shape[0], documents.size
+
+
+def run_stage(name, ctx, conn):
+    """Выполняет этап в дочернем процессе и отправляет результат через conn"""
+
+    try:
+        spec = STAGES[name]
+        data = spec['prepare'](ctx) if spec['prepare'] else None
+
+        started = time.perf_counter()
+        items, size = spec['func'](ctx, data)
+        secs = time.perf_counter() - started
+
+        conn.send({
+            'secs': round(secs, 4),
+            'items': items,
+            'bytes': size,
+            'items_per_sec': round(items / secs, 2) if secs else None,
+            'mb_per_sec': round(size / secs / 1024 ** 2, 3) if secs and size else None,
+            # В Linux ru_maxrss - в килобайтах
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        })
+    except Exception as e:
+        conn.send({'error': '{}: {}'.format(type(e).__name__, e)})
+    finally:
+        conn.close()
+
+
+def measure(name, ctx):
+    """Запускает этап в отдельном процессе и возвращает его результат"""
+
+    context = multiprocessing.get_context('fork')
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=run_stage, args=(name, ctx, child))
+    process.start()
+    child.close()
+
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = {'error': 'процесс этапа завершился с кодом {}'.format(process.exitcode)}
+    process.join()
+
+    return result
+
+
+def throughput(result):
+    return result.get('mb_per_sec') or result.get('items_per_sec')
+
+
+def compare(results, baseline, tolerance):
+    """Возвращает список регрессий относительно baseline: (этап, описание)"""
+
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('stages', {}).get(name)
+        if not base or 'secs' not in result or 'secs' not in base:
+            continue
+
+        if throughput(base) and throughput(result) < throughput(base) * (1 - tolerance):
+            regressions.append((name, 'пропускная способность {:.3f} против {:.3f}'.format(
+                throughput(result), throughput(base))))
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append((name, 'пиковый RSS {} МБ против {} МБ'.format(
+                result['peak_rss_mb'], base['peak_rss_mb'])))
+
+    return regressions
+
+
+def ready(name, ctx, results):
+    """Проверяет, что результат этапа name есть: он выполнен сейчас или остался от прошлого запуска"""
+
+    if name in results:
+        return 'secs' in results[name]
+
+    return os.path.isdir(ctx[STAGES[name]['output']])
+
+
+def run(ctx, names):
+    """Выполняет этапы names по порядку и возвращает их результаты"""
+
+    results = OrderedDict()
+    for name in names:
+        spec = STAGES[name]
+        missing = [resource_name for resource_name in spec['resources'] if not is_installed(resource_name)]
+
+        if missing:
+            result = {'skipped': 'нет ресурсов NLTK: {}'.format(', '.join(missing))}
+        elif spec['after'] and not ready(spec['after'], ctx, results):
+            result = {'skipped': 'нет результата этапа {}'.format(spec['after'])}
+        else:
+            result = measure(name, ctx)
+
+        results[name] = result
+        print(format_result(name, result))
+
+    return results
+
+
+def format_result(name, result):
+    if 'skipped' in result:
+        return '{:22} пропущен: {}'.format(name, result['skipped'])
+    if 'error' in result:
+        return '{:22} ОШИБКА: {}'.format(name, result['error'])
+
+    line = '{:22} {:9.3f} с {:12.1f} ед/с'.format(name, result['secs'], result['items_per_sec'] or 0)
+    if result['mb_per_sec']:
+        line += ' {:9.3f} МБ/с'.format(result['mb_per_sec'])
+    else:
+        line += ' ' * 14
+    return line + ' {:9.1f} МБ RSS'.format(result['peak_rss_mb'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замеры производительности конвейера')
+    parser.add_argument('--size', default='10mb', help='размер синтетического корпуса: 10mb, 1gb, 10gb или байты')
+    parser.add_argument('--corpus', help='готовый корпус вместо синтетического')
+    parser.add_argument('--work', help='рабочий каталог (синтетический корпус, обработанный корпус)')
+    parser.add_argument('--stages', help='этапы через запятую, по умолчанию все')
+    parser.add_argument('--n-jobs', type=int, default=None, help='число процессов для этапов с пулом')
+    parser.add_argument('--save', help='сохранить результаты в JSON')
+    parser.add_argument('--baseline', help='сравнить с результатами из JSON')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='допустимое ухудшение (доля)')
+    args = parser.parse_args(argv)
+
+    work = args.work or os.path.join(tempfile.gettempdir(), 'textanalysis-bench')
+    corpus = args.corpus
+    if corpus is None:
+        corpus = os.path.join(work, 'synthetic-' + args.size)
+        params = generate(corpus, args.size)
+        print('Синтетический корпус {}: {} документов, {:.1f} МБ'.format(
+            corpus, params['docs'], params['bytes'] / 1024 ** 2))
+
+    ctx = {
+        'corpus': corpus,
+        'work': work,
+        'pickled': os.path.join(work, 'pickled'),
+        'n_jobs': args.n_jobs,
+    }
+
+    names = args.stages.split(',') if args.stages else list(STAGES)
+    unknown = [name for name in names if name not in STAGES]
+    if unknown:
+        parser.error('неизвестные этапы: {}'.format(', '.join(unknown)))
+
+    results = run(ctx, names)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'corpus': corpus, 'stages': results}, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+        for name, message in regressions:
+            print('РЕГРЕССИЯ {}: {}'.format(name, message))
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
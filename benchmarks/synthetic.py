@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Генератор синтетического HTML-корпуса для замеров производительности.
+
+Корпус записывается в раскладку, которую читает HTMLCorpusReader: <корень>/Category N/documentM.txt.
+Каждый документ - HTML-страница с заголовком и абзацами <p>, похожая на статью (иначе readability
+отбросит текст). Слова составляются из русских слогов, частоты слов подчиняются закону Ципфа,
+среди самых частых слов - служебные слова и слова-признаки рода из MaleFemale. Предложения генерируются
+заново для каждого документа, чтобы кеши (теггера, нормализатора) не получали неестественно
+много попаданий.
+
+Генерация детерминирована (seed). Параметры записываются в <корень>/.synthetic.json, и повторный
+вызов с теми же параметрами ничего не делает. Сеть не нужна.
+
+Запуск из корня проекта:
+python benchmarks/synthetic.py <корень> [размер: 10mb | 1gb | 10gb | число байт]
+"""
+
+import json
+import os
+import shutil
+import sys
+import numpy as np
+
+MARKER_NAME = '.synthetic.json'
+
+# Готовые размеры корпуса
+SIZES = {
+    '10mb': 10 * 1024 ** 2,
+    '1gb': 1024 ** 3,
+    '10gb': 10 * 1024 ** 3,
+}
+
+SYLLABLES = [
+    'ка', 'ба', 'ва', 'го', 'да', 'же', 'за', 'ки', 'ло', 'ма', 'но', 'па', 'ро', 'са', 'та', 'ку', 'фа', 'ха',
+    'це', 'ча', 'ши', 'ще', 'ль', 'ны', 'ст', 'ра', 'ве', 'ни', 'ко', 'пе', 'ту', 'ми', 'ре', 'ле', 'ди', 'бо',
+]
+
+# Самые частые слова корпуса: служебные слова и слова-признаки рода
+COMMON_WORDS = [
+    'и', 'в', 'не', 'на', 'что', 'с', 'он', 'она', 'как', 'а', 'по', 'но', 'это', 'к', 'из', 'у', 'за', 'от',
+    'о', 'так', 'для', 'мужчина', 'женщина', 'брат', 'сестра', 'двоюродный', 'отец', 'мама', 'друг', 'подруга',
+]
+
+
+def vocabulary(size, rng):
+    """Словарь из size слов: сначала частые слова, затем слова из 1-4 случайных слогов"""
+
+    words = list(COMMON_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = ''.join(rng.choice(SYLLABLES, size=rng.integers(1, 5)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+
+    return words
+
+
+class SyntheticCorpus(object):
+
+    def __init__(self, vocab_size=50000, doc_size=20000, categories=3, seed=0):
+        """doc_size - примерный размер документа в байтах, categories - число категорий"""
+
+        self.vocab_size = vocab_size
+        self.doc_size = doc_size
+        self.categories = categories
+        self.seed = seed
+
+        self.rng = np.random.default_rng(seed)
+        self.words = vocabulary(vocab_size, self.rng)
+        weights = 1 / np.arange(1, vocab_size + 1)
+        self.cumulative = np.cumsum(weights / weights.sum())
+
+    def sentence_words(self, n):
+        """n случайных номеров слов с распределением Ципфа"""
+
+        return np.minimum(np.searchsorted(self.cumulative, self.rng.random(n)), self.vocab_size - 1)
+
+    def paragraph(self):
+        sentences = []
+        for length in self.rng.integers(5, 21, size=self.rng.integers(3, 9)):
+            words = [self.words[i] for i in self.sentence_words(length)]
+            sentences.append(' '.join(words).capitalize() + '.')
+
+        return ' '.join(sentences)
+
+    def document(self):
+        title = ' '.join(self.words[i] for i in self.sentence_words(5)).capitalize()
+        parts = [
+            '<html><head><title>{}</title></head><body>'.format(title),
+            '<div class="article"><h1>{}</h1>'.format(title),
+        ]
+
+        size = 0
+        while size < self.doc_size:
+            para = self.paragraph()
+            parts.append('<p>{}</p>'.format(para))
+            size += len(para.encode('utf-8'))
+
+        parts.append('</div></body></html>')
+        return '\n'.join(parts)
+
+    def params(self, size):
+        return {
+            'size': size,
+            'vocab_size': self.vocab_size,
+            'doc_size': self.doc_size,
+            'categories': self.categories,
+            'seed': self.seed,
+        }
+
+    def generate(self, root, size):
+        """
+        Записывает в root документы общим размером не меньше size байт.
+
+        Возвращает параметры корпуса с числом документов и их общим размером.
+        """
+
+        marker = os.path.join(root, MARKER_NAME)
+        params = self.params(size)
+        if os.path.exists(marker):
+            with open(marker, 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+            if all(existing.get(key) == value for key, value in params.items()):
+                return existing
+
+            # Корпус с другими параметрами: удаляем его документы, чтобы не смешать два корпуса
+            for name in os.listdir(root):
+                if name.startswith('Category '):
+                    shutil.rmtree(os.path.join(root, name))
+
+        for category in range(1, self.categories + 1):
+            os.makedirs(os.path.join(root, 'Category {}'.format(category)), exist_ok=True)
+
+        written = docs = 0
+        while written < size:
+            category = docs % self.categories + 1
+            path = os.path.join(root, 'Category {}'.format(category), 'document{}.txt'.format(docs + 1))
+            data = self.document().encode('utf-8')
+            with open(path, 'wb') as f:
+                f.write(data)
+            written += len(data)
+            docs += 1
+
+        params.update(docs=docs, bytes=written)
+        with open(marker, 'w', encoding='utf-8') as f:
+            json.dump(params, f)
+
+        return params
+
+
+def generate(root, size='10mb', **kwargs):
+    """Генерирует корпус размера size (ключ SIZES или число байт) в root"""
+
+    size = SIZES[size] if size in SIZES else int(size)
+    return SyntheticCorpus(**kwargs).generate(root, size)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        print(__doc__)
+        sys.exit(1)
+
+    params = generate(*sys.argv[1:])
+    print('Документов: {docs}, размер: {bytes} байт'.format(**params))
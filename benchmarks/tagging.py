@@ -0,0 +1,62 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Скорость разметки частей речи: pos_tag на каждое предложение против Tagger.
+
+Предложения берутся из абзацев корпуса (по умолчанию resources/corpus) и размечаются:
+1. как раньше - pos_tag(wordpunct_tokenize(sent), lang='rus') на каждое предложение;
+2. Tagger без кеша - одна загруженная модель, разметка пачкой;
+3. Tagger с кешем повторяющихся предложений.
+Выводится число предложений в секунду и проверяется, что результаты совпадают.
+
+Запуск из корня проекта:
+python benchmarks/tagging.py [корень корпуса]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nltk import (pos_tag, sent_tokenize, wordpunct_tokenize)
+from classes.CustomCorpusReader import HTMLCorpusReader
+from classes.Resources import require
+from classes.Tagger import Tagger
+from config import CORPUS_ROOT
+
+
+def rate(name, func, sents):
+    """Размечает sents функцией func и выводит скорость"""
+
+    started = time.perf_counter()
+    result = func(sents)
+    secs = time.perf_counter() - started
+    print('{}: {:.0f} предложений/с ({:.3f} с)'.format(name, len(sents) / secs, secs))
+
+    return result
+
+
+def main(root=CORPUS_ROOT):
+    require('punkt', 'averaged_perceptron_tagger_ru')
+
+    reader = HTMLCorpusReader(root)
+    sents = [wordpunct_tokenize(sent) for para in reader.paras() for sent in sent_tokenize(para)]
+    print('Предложений: {}, уникальных: {}'.format(len(sents), len(set(map(tuple, sents)))))
+
+    before = rate('pos_tag на предложение', lambda batch: [pos_tag(tokens, lang='rus') for tokens in batch], sents)
+    plain = rate('Tagger без кеша', Tagger(memoize=False).tag_sents, sents)
+
+    tagger = Tagger()
+    cached = rate('Tagger с кешем', tagger.tag_sents, sents)
+    print('Кеш: {}'.format(tagger.cache.info()))
+
+    same = before == plain == cached
+    print('Результаты совпадают' if same else 'РЕЗУЛЬТАТЫ РАЗЛИЧАЮТСЯ')
+
+    return same
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main(*sys.argv[1:]) else 1)
@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Сравнение способов TF-IDF кодирования: TextCollection.tf_idf из NLTK (прежняя реализация
+nltk_tfidf_vectorize), TfidfIndex и scikit_tfidf_vectorize.
+
+Корпус синтетический: документы из случайных слов с распределением Ципфа, поэтому замер не требует
+ни корпуса, ни данных NLTK. Все три способа получают одинаковые лексемы (для Scikit документ
+склеивается обратно в строку). Для NLTK берутся только первые nltk_docs документов - на всем корпусе
+он работает слишком долго; заодно проверяется, что оценки TfidfIndex на них совпадают с NLTK.
+
+Запуск из корня проекта:
+python benchmarks/tfidf.py [документов] [слов в документе] [документов для NLTK]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nltk.text import TextCollection
+from classes.BagOfWords import scikit_tfidf_vectorize
+from classes.TfidfIndex import TfidfIndex
+
+
+def synthetic_corpus(n_docs, doc_len, vocab_size=50000, seed=0):
+    """Возвращает n_docs списков по doc_len лексем с распределением частот по закону Ципфа"""
+
+    rng = random.Random(seed)
+    words = ['w{}'.format(i) for i in range(vocab_size)]
+    weights = [1 / (rank + 1) for rank in range(vocab_size)]
+
+    return [rng.choices(words, weights, k=doc_len) for _ in range(n_docs)]
+
+
+def nltk_tfidf(corpus):
+    """Прежняя реализация nltk_tfidf_vectorize"""
+
+    texts = TextCollection(corpus)
+    return [{term: texts.tf_idf(term, doc) for term in doc} for doc in corpus]
+
+
+def engine_tfidf(corpus):
+    index = TfidfIndex()
+    return index, index.fit_transform(corpus)
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main(n_docs=5000, doc_len=300, nltk_docs=200):
+    corpus = synthetic_corpus(n_docs, doc_len)
+    sample = corpus[:nltk_docs]
+    print('Документов: {}, лексем в документе: {}, NLTK - на {} документах'.format(n_docs, doc_len, len(sample)))
+
+    expected, nltk_secs = timed(nltk_tfidf, sample)
+    (index, vectors), sample_secs = timed(engine_tfidf, sample)
+
+    # Наибольшее расхождение с оценками NLTK
+    error = 0.0
+    for scores, row in zip(expected, vectors):
+        values = dict(zip(row.indices, row.data))
+        for term, value in scores.items():
+            error = max(error, abs(values[index.vocabulary_[term]] - value))
+
+    (_, matrix), engine_secs = timed(engine_tfidf, corpus)
+    _, scikit_secs = timed(scikit_tfidf_vectorize, [' '.join(doc) for doc in corpus])
+
+    print('NLTK TextCollection ({} док.): {:.3f} с'.format(len(sample), nltk_secs))
+    print('TfidfIndex ({} док.): {:.3f} с, ускорение {:.0f}x, расхождение с NLTK {:.2e}'.format(
+        len(sample), sample_secs, nltk_secs / sample_secs, error))
+    print('TfidfIndex ({} док.): {:.3f} с, матрица {}x{}, {} ненулевых'.format(
+        n_docs, engine_secs, matrix.shape[0], matrix.shape[1], matrix.nnz))
+    print('Scikit TfidfVectorizer ({} док.): {:.3f} с'.format(n_docs, scikit_secs))
+
+    return error
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    sys.exit(1 if main(*args) > 1e-9 else 0)
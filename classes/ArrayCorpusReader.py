@@ -0,0 +1,295 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Компактное бинарное представление обработанного корпуса, которое можно отображать в память.
+
+PickledCorpusReader при каждом проходе распаковывает документы в миллионы мелких объектов Python
+(списки и кортежи строк). Здесь словарь лексем и таблица тегов хранятся на весь корпус один раз,
+а документы превращаются в плоские массивы целых чисел:
+
+tokens.bin - идентификаторы лексем всех документов подряд (int32);
+tags.bin - идентификаторы тегов (uint16), по одному на лексему;
+sents.bin - смещения начала каждого предложения в tokens.bin (int64, плюс завершающее);
+paras.bin - смещения начала каждого абзаца в sents.bin (int64, плюс завершающее);
+docs.bin - смещения начала каждого документа в paras.bin (int64, плюс завершающее);
+meta.json - идентификаторы и категории документов, словарь лексем и таблица тегов.
+
+Массивы и meta.json одной записи лежат в отдельном каталоге версии (v00001, v00002, ...), который
+становится текущим заменой файла CURRENT в корне (см. Manifest.publish_version), как у шардов ShardStore.
+Поэтому при перезаписи хранилища или после падения читатель не увидит новые массивы со старым meta.json.
+Хранилища старого вида (массивы прямо в корне, без CURRENT) читаются как раньше.
+
+Массивы открываются через numpy.memmap, поэтому повторные проходы по корпусу (например, по эпохам
+обучения) читают данные из страничного кеша ОС без копирования, а token_ids/tag_ids отдают
+срезы массивов без создания объектов на каждую лексему. Поверх массивов доступны те же представления
+docs/paras/sents/tagged/words, что и у PickledCorpusReader.
+"""
+
+from array import array
+import json
+import os
+import re
+import numpy as np
+from classes.CustomCorpusReader import CAT_PATTERN
+from classes.Manifest import atomic_open, current_version, new_version, publish_version
+
+META_NAME = 'meta.json'
+
+# Имя массива -> (код типа array, тип numpy)
+ARRAYS = {
+    'tokens': ('i', np.int32),
+    'tags': ('H', np.uint16),
+    'sents': ('q', np.int64),
+    'paras': ('q', np.int64),
+    'docs': ('q', np.int64),
+}
+
+# Идентификаторы тегов хранятся в uint16
+MAX_TAGS = np.iinfo(np.uint16).max + 1
+
+
+def array_root(root):
+    """Возвращает каталог текущей версии хранилища root (для хранилища старого вида - сам root)"""
+
+    version = current_version(root)
+    if version is None:
+        return root
+
+    return os.path.join(root, version)
+
+
+class ArrayCorpusWriter(object):
+
+    """Потоково записывает документы (списки абзацев из предложений с кортежами (token, tag)) в массивы"""
+
+    def __init__(self, root, cat_pattern=CAT_PATTERN, keep=2):
+        """keep - сколько последних версий хранилища оставлять (см. Manifest.publish_version)"""
+
+        self.root = root
+        self.cat_pattern = cat_pattern
+        self.keep = keep
+
+        # Все файлы пишутся в новую версию, которая станет видна только после close()
+        self.version = new_version(root)
+        self.dirname = os.path.join(root, self.version)
+
+        self.fileids = []
+        self.categories = []
+        self.vocab = {}
+        self.tagset = {}
+
+        # Текущие длины массивов tokens, sents и paras - из них получаются смещения
+        self.n_tokens = 0
+        self.n_sents = 0
+        self.n_paras = 0
+
+        self.files = {
+            name: open(self.path(name), 'wb')
+            for name in ARRAYS
+        }
+
+    def path(self, name):
+        return os.path.join(self.dirname, name + '.bin')
+
+    def write(self, name, values):
+        array(ARRAYS[name][0], values).tofile(self.files[name])
+
+    def add(self, fileid, document):
+        """Дописывает документ в конец массивов"""
+
+        # Проверяем до записи, чтобы документ не остался в массивах наполовину
+        tags = {tag for para in document for sent in para for _, tag in sent}
+        if len(self.tagset.keys() | tags) > MAX_TAGS:
+            raise ValueError("В документе {} слишком много новых тегов: идентификаторы тегов хранятся в uint16, "
+                             "помещается не больше {} различных тегов".format(fileid, MAX_TAGS))
+
+        self.fileids.append(fileid)
+        self.categories.append(re.match(self.cat_pattern, fileid).group(1))
+        self.write('docs', [self.n_paras])
+
+        for para in document:
+            self.write('paras', [self.n_sents])
+            self.n_paras += 1
+
+            for sent in para:
+                self.write('sents', [self.n_tokens])
+                self.n_sents += 1
+
+                self.write('tokens', [self.vocab.setdefault(token, len(self.vocab)) for token, _ in sent])
+                self.write('tags', [self.tagset.setdefault(tag, len(self.tagset)) for _, tag in sent])
+                self.n_tokens += len(sent)
+
+    def close(self):
+        """
+        Дописывает завершающие смещения, сохраняет meta.json и публикует версию заменой CURRENT.
+
+        Массивы хранилища старого вида из корня удаляются после публикации.
+        """
+
+        self.write('docs', [self.n_paras])
+        self.write('paras', [self.n_sents])
+        self.write('sents', [self.n_tokens])
+
+        for f in self.files.values():
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+
+        meta = {
+            'fileids': self.fileids,
+            'categories': self.categories,
+            'vocab': sorted(self.vocab, key=self.vocab.get),
+            'tags': sorted(self.tagset, key=self.tagset.get),
+        }
+        with atomic_open(os.path.join(self.dirname, META_NAME), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        publish_version(self.root, self.version, self.keep)
+
+        for name in [name + '.bin' for name in ARRAYS] + [META_NAME]:
+            if os.path.exists(os.path.join(self.root, name)):
+                os.remove(os.path.join(self.root, name))
+
+    @classmethod
+    def convert(cls, reader, root, fileids=None, categories=None):
+        """Переписывает обработанный корпус из reader (например, PickledCorpusReader) в массивы"""
+
+        fileids = reader.resolve(fileids, categories) or reader.fileids()
+        writer = cls(root)
+        for fileid in fileids:
+            writer.add(fileid, next(reader.docs(fileid)))
+        writer.close()
+
+        return root
+
+
+class ArrayCorpusReader(object):
+
+    """Объект чтения корпуса, записанного ArrayCorpusWriter"""
+
+    def __init__(self, root):
+        self.root = root
+        # Каталог версии запоминается, чтобы meta.json и массивы читались из одной записи хранилища
+        self.path = array_root(root)
+
+        with open(os.path.join(self.path, META_NAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        self._fileids = meta['fileids']
+        self._index = {fileid: i for i, fileid in enumerate(self._fileids)}
+        self._categories = meta['categories']
+        self.vocab = meta['vocab']
+        self.tagset = meta['tags']
+
+        self.arrays = {name: self.load(name, dtype) for name, (_, dtype) in ARRAYS.items()}
+
+    def load(self, name, dtype):
+        path = os.path.join(self.path, name + '.bin')
+        # numpy не умеет отображать в память пустой файл
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def fileids(self, categories=None):
+        if categories is None:
+            return list(self._fileids)
+        if isinstance(categories, str):
+            categories = [categories]
+
+        return [fileid for fileid, category in zip(self._fileids, self._categories) if category in categories]
+
+    def categories(self, fileids=None):
+        if fileids is None:
+            return sorted(set(self._categories))
+        if isinstance(fileids, str):
+            fileids = [fileids]
+
+        return sorted(set(self._categories[self._index[fileid]] for fileid in fileids))
+
+    def resolve(self, fileids, categories):
+        """Фильтрация документов корпуса, как в HTMLCorpusReader"""
+
+        if fileids is not None and categories is not None:
+            raise ValueError("Укажите fileids или categories, но не то и другое разом")
+
+        if categories is not None:
+            return self.fileids(categories)
+
+        return fileids
+
+    def spans(self, fileids=None, categories=None):
+        """Возвращает для каждого документа номера его первого и следующего за последним абзаца"""
+
+        fileids = self.resolve(fileids, categories) or self._fileids
+        if isinstance(fileids, str):
+            fileids = [fileids]
+
+        docs = self.arrays['docs']
+        for fileid in fileids:
+            i = self._index[fileid]
+            yield int(docs[i]), int(docs[i + 1])
+
+    def token_ids(self, fileid):
+        """Идентификаторы лексем документа - срез отображенного в память массива, без копирования"""
+
+        return self._token_slice('tokens', fileid)
+
+    def tag_ids(self, fileid):
+        """Идентификаторы тегов документа - срез отображенного в память массива, без копирования"""
+
+        return self._token_slice('tags', fileid)
+
+    def _token_slice(self, name, fileid):
+        start, end = next(self.spans(fileid))
+        paras, sents = self.arrays['paras'], self.arrays['sents']
+        return self.arrays[name][sents[paras[start]]:sents[paras[end]]]
+
+    def _sent(self, i):
+        """Восстанавливает предложение i как список кортежей (token, tag)"""
+
+        sents = self.arrays['sents']
+        start, end = sents[i], sents[i + 1]
+        vocab, tagset = self.vocab, self.tagset
+
+        return [
+            (vocab[token], tagset[tag])
+            for token, tag in zip(self.arrays['tokens'][start:end].tolist(), self.arrays['tags'][start:end].tolist())
+        ]
+
+    def _para(self, i):
+        paras = self.arrays['paras']
+        return [self._sent(j) for j in range(paras[i], paras[i + 1])]
+
+    def docs(self, fileids=None, categories=None):
+        """Возвращает документы в том же виде, что и PickledCorpusReader.docs"""
+
+        for start, end in self.spans(fileids, categories):
+            yield [self._para(i) for i in range(start, end)]
+
+    def paras(self, fileids=None, categories=None):
+        for start, end in self.spans(fileids, categories):
+            for i in range(start, end):
+                yield self._para(i)
+
+    def sents(self, fileids=None, categories=None):
+        for para in self.paras(fileids, categories):
+            for sent in para:
+                yield sent
+
+    def tagged(self, fileids=None, categories=None):
+        for sent in self.sents(fileids, categories):
+            for tagged_token in sent:
+                yield tagged_token
+
+    def words(self, fileids=None, categories=None):
+        """Лексемы берутся прямо из массива идентификаторов, без сборки кортежей с тегами"""
+
+        fileids = self.resolve(fileids, categories) or self._fileids
+        if isinstance(fileids, str):
+            fileids = [fileids]
+
+        vocab = self.vocab
+        for fileid in fileids:
+            for token in self.token_ids(fileid).tolist():
+                yield vocab[token]
@@ -0,0 +1,361 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Параллельная загрузка статей в корпус.
+
+Страницы скачиваются пулом потоков через один requests.Session, поэтому соединения с сервером
+переиспользуются (keep-alive). Одновременно выполняется не больше max_workers запросов, а к одному
+хосту - не больше per_host запросов и не чаще rate запросов в секунду. Неудачные запросы (ошибки
+соединения, таймауты, ответы 429 и 5xx) повторяются с экспоненциальной задержкой.
+
+Загруженные страницы кешируются на диске вместе с заголовками ETag и Last-Modified. При повторной
+загрузке сервер получает условный запрос (If-None-Match / If-Modified-Since) и, если страница
+не изменилась, отвечает 304 без тела - страница берется из кеша. Если же кешированного тела нет,
+страница запрашивается заново без условных заголовков. Заголовок Retry-After ответов 429 и 503
+учитывается: пауза перед повтором не короче, чем просит сервер.
+
+Страницы записываются в раскладку, которую ожидает HTMLCorpusReader: CORPUS_ROOT/<категория>/<документ>.txt.
+Идентификатор документа должен подходить под DOC_PATTERN (в том числе категория - под CAT_PATTERN).
+Какому адресу принадлежит каждый документ, хранится в root/.sources.json, поэтому совпадающие имена
+документов разных адресов (в том числе из разных запусков) различаются суффиксом из хеша адреса,
+а не перезаписывают друг друга (см. claim).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from classes.CustomCorpusReader import DOC_PATTERN
+from classes.Manifest import atomic_open
+from config import CORPUS_ROOT
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+# Ответы, в которых сервер может указать в Retry-After, когда повторить запрос
+RETRY_AFTER_STATUSES = frozenset([429, 503])
+# Файл в корне корпуса: fileid -> адрес статьи, из которой он загружен
+SOURCES_NAME = '.sources.json'
+
+
+def document_name(url):
+    """Имя документа корпуса по адресу статьи: последний сегмент пути, подходящий под DOC_PATTERN"""
+
+    parts = urlsplit(url)
+    segment = parts.path.rstrip('/').rsplit('/', 1)[-1] or parts.netloc
+    name = re.sub(r'[^\w\-]+', '-', segment).strip('-')[:100]
+
+    return name or hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def url_suffix(url):
+    """Короткий хеш адреса для различения документов с одинаковыми именами"""
+
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]
+
+
+def retry_after(response):
+    """Возвращает паузу в секундах из заголовка Retry-After (число секунд или HTTP-дата) или None"""
+
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostLimiter(object):
+
+    """Ограничивает число одновременных запросов к хосту и их частоту"""
+
+    def __init__(self, concurrency, rate=None):
+        self.semaphore = threading.BoundedSemaphore(concurrency)
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_time = 0
+
+    def __enter__(self):
+        self.semaphore.acquire()
+
+        # Каждый запрос занимает следующий свободный интервал и ждет его начала
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+
+        if start > now:
+            time.sleep(start - now)
+
+    def __exit__(self, *exc):
+        self.semaphore.release()
+
+
+class ArticleFetcher(object):
+
+    def __init__(self, root=CORPUS_ROOT, cache=None, max_workers=8, per_host=2, rate=None, retries=3,
+                 backoff=0.5, timeout=10, encoding='utf-8', headers=None, max_retry_after=300):
+        """
+        root - корень корпуса, cache - каталог кеша страниц (None - без кеша),
+        max_workers - число потоков, per_host - одновременных запросов к одному хосту,
+        rate - запросов в секунду к одному хосту (None - без ограничения),
+        retries - число повторов неудачного запроса, backoff - задержка перед первым повтором (секунды),
+        timeout - таймаут соединения и чтения (секунды), encoding - кодировка файлов корпуса,
+        max_retry_after - наибольшая пауза по заголовку Retry-After (секунды).
+        """
+
+        self.root = root
+        self.cache = cache
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.encoding = encoding
+        self.max_retry_after = max_retry_after
+
+        self.session = requests.Session()
+        # Пул соединений должен вмещать все потоки, иначе лишние соединения будут закрываться
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+        self.limiters = {}
+        self.limiters_lock = threading.Lock()
+
+        self.sources = self.load_sources()
+        self.sources_lock = threading.Lock()
+
+        if cache is not None and not os.path.exists(cache):
+            os.makedirs(cache)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def load_sources(self):
+        path = os.path.join(self.root, SOURCES_NAME)
+        if not os.path.exists(path):
+            return {}
+
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_sources(self):
+        os.makedirs(self.root, exist_ok=True)
+        with self.sources_lock:
+            with atomic_open(os.path.join(self.root, SOURCES_NAME), 'w', encoding='utf-8') as f:
+                json.dump(self.sources, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+    def claim(self, url, category, name=None):
+        """
+        Возвращает идентификатор документа для статьи и закрепляет его за адресом url.
+
+        Если имя, полученное из адреса (document_name), уже занято другим адресом, к нему добавляется
+        короткий хеш адреса. Явно заданное имя, занятое другим адресом, и идентификатор, не подходящий
+        под DOC_PATTERN, отвергаются с ValueError.
+        """
+
+        fileid = '{}/{}.txt'.format(category, name or document_name(url))
+        if not re.match(DOC_PATTERN + '$', fileid):
+            raise ValueError("Идентификатор документа {} не подходит под DOC_PATTERN корпуса".format(fileid))
+
+        with self.sources_lock:
+            owner = self.sources.setdefault(fileid, url)
+            if owner == url:
+                return fileid
+            if name is not None:
+                raise ValueError("Имя документа {} уже занято адресом {}".format(fileid, owner))
+
+            fileid = '{}/{}-{}.txt'.format(category, document_name(url), url_suffix(url))
+            self.sources.setdefault(fileid, url)
+            return fileid
+
+    def limiter(self, url):
+        host = urlsplit(url).netloc
+        with self.limiters_lock:
+            if host not in self.limiters:
+                self.limiters[host] = HostLimiter(self.per_host, self.rate)
+            return self.limiters[host]
+
+    def cache_path(self, url):
+        return os.path.join(self.cache, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def cache_load(self, url):
+        """Возвращает (заголовки, тело) страницы из кеша или None"""
+
+        if self.cache is None:
+            return None
+
+        path = self.cache_path(url)
+        if not (os.path.exists(path + '.json') and os.path.exists(path + '.body')):
+            return None
+
+        with open(path + '.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(path + '.body', 'rb') as f:
+            body = f.read()
+
+        return meta, body
+
+    def cache_save(self, url, response):
+        if self.cache is None:
+            return
+
+        path = self.cache_path(url)
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'encoding': response.encoding,
+        }
+
+        # Сначала тело, затем заголовки: без заголовков запись кеша не используется
+        with atomic_open(path + '.body', 'wb') as f:
+            f.write(response.content)
+        with atomic_open(path + '.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    def request(self, url):
+        """
+        Загружает страницу с повторами и условным запросом к кешу.
+
+        Возвращает (статус, текст страницы), статус - 'fetched' (загружена) или 'not_modified'
+        (сервер ответил 304, текст взят из кеша).
+        """
+
+        cached = self.cache_load(url)
+        headers = {}
+        if cached is not None:
+            meta = cached[0]
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = self.send(url, headers)
+        if response.status_code == 304:
+            if cached is not None:
+                meta, body = cached
+                return 'not_modified', body.decode(meta.get('encoding') or 'utf-8', errors='replace')
+
+            # 304 без тела в кеше: пустую страницу не записываем, а запрашиваем ее заново без условий
+            response = self.send(url, {})
+            if response.status_code == 304:
+                raise requests.HTTPError("Сервер ответил 304 на безусловный запрос {}".format(url), response=response)
+
+        response.raise_for_status()
+        if 'charset' not in response.headers.get('Content-Type', ''):
+            # Без charset в заголовке requests считает текст кодировкой ISO-8859-1
+            response.encoding = response.apparent_encoding
+        self.cache_save(url, response)
+        return 'fetched', response.text
+
+    def send(self, url, headers):
+        """
+        Выполняет GET с повторами при ошибках соединения, таймаутах и ответах из RETRY_STATUSES.
+
+        Пауза перед повтором растет экспоненциально, но не короче Retry-After (не больше max_retry_after).
+        Возвращает последний полученный ответ.
+        """
+
+        limiter = self.limiter(url)
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            delay = self.backoff * 2 ** attempt
+            try:
+                with limiter:
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if last:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or last:
+                    return response
+                if response.status_code in RETRY_AFTER_STATUSES:
+                    wait = retry_after(response)
+                    if wait is not None:
+                        delay = max(delay, min(wait, self.max_retry_after))
+
+            time.sleep(delay)
+
+    def get(self, url):
+        """Возвращает текст страницы"""
+
+        return self.request(url)[1]
+
+    def fetch(self, url, category, name=None, save=True):
+        """
+        Загружает статью и записывает ее в root/<category>/<name>.txt (имя - см. claim).
+
+        Возвращает словарь с адресом, идентификатором документа в корпусе (fileid), статусом
+        ('fetched', 'not_modified' или 'error') и ошибкой. Ошибки не прерывают загрузку остальных статей.
+        save=False - не сохранять принадлежность документов адресам (fetch_all сохраняет ее сам в конце).
+        """
+
+        result = {'url': url, 'fileid': '{}/{}.txt'.format(category, name or document_name(url)),
+                  'status': None, 'error': None}
+
+        try:
+            fileid = result['fileid'] = self.claim(url, category, name)
+            if save:
+                self.save_sources()
+
+            status, text = self.request(url)
+            path = os.path.join(self.root, fileid)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with atomic_open(path, 'w', encoding=self.encoding) as f:
+                f.write(text)
+            result['status'] = status
+        except Exception as e:
+            result['status'] = 'error'
+            result['error'] = '{}: {}'.format(type(e).__name__, e)
+
+        return result
+
+    def fetch_all(self, articles):
+        """
+        Загружает статьи в пуле потоков.
+
+        articles - последовательность кортежей (url, category) или (url, category, name).
+        Возвращает список результатов fetch в порядке articles.
+
+        Имена документов закрепляются за адресами до загрузки, по порядку articles, поэтому при совпадении
+        имен суффикс получает всегда одна и та же (более поздняя) статья.
+        """
+
+        articles = list(articles)
+        for article in articles:
+            try:
+                self.claim(*article)
+            except ValueError:
+                # fetch вернет эту ошибку в результате статьи
+                pass
+
+        try:
+            with ThreadPoolExecutor(self.max_workers) as pool:
+                futures = [pool.submit(self.fetch, *article, save=False) for article in articles]
+                return [future.result() for future in futures]
+        finally:
+            self.save_sources()
@@ -36,13 +36,16 @@ tfidf(t,d,D) = tf(t,d) * idf(t,D)
 Лучшее кодирование: TF-IDF
 """
 
-import nltk
-import string
 import gensim
-from collections import defaultdict
+from collections import defaultdict, Counter
 from sklearn.feature_extraction.text import (CountVectorizer, TfidfVectorizer)
 from sklearn.preprocessing import Binarizer
-from nltk.text import TextCollection
+from classes.StemmingTokenizer import StemmingTokenizer
+from classes.TfidfIndex import TfidfIndex
+from classes.TokenIdStore import TokenIdStore
+
+# Один лексемизатор на модуль: стеммер и кеш основ переиспользуются всеми векторизаторами
+TOKENIZER = StemmingTokenizer('russian')
 
 
 def tokenize(text):
@@ -56,14 +59,8 @@ def tokenize(text):
     :return:
     """
 
-    stem = nltk.stem.SnowballStemmer('russian')
-    text = text.lower()
-
-    for token in nltk.word_tokenize(text):
-        if token in string.punctuation:
-            continue
-
-        yield stem.stem(token)
+    for token in TOKENIZER.tokenize(text):
+        yield token
 
 
 def nltk_vectorize(doc):
@@ -94,7 +91,7 @@ def nltk_logical_vectorize(doc):
     }
 
 
-def nltk_tfidf_vectorize(corpus):
+def nltk_tfidf_vectorize(corpus, n_jobs=None):
     """
     Реализует TF-IDF кодирование с помощью NLTK
 
@@ -102,19 +99,18 @@ def nltk_tfidf_vectorize(corpus):
     а значениями - их оценки TF-IDF для данного конкретного документа
     """
 
-    corpus = [
-        [token for token in tokenize(doc)]
-        for doc in corpus
-    ]
+    corpus = list(TOKENIZER.tokenize_many(corpus, n_jobs))
 
-    # TextCollection - обертывает список документов или корпус. Поддерживает подсчет вхождений,
-    # вычисление оценки согласованности (конкордантности), определение устойчивых словосочетаний и
-    # непосредственно то, что нам надо - вычисляет tf_idf
-    texts = TextCollection(corpus)
+    # Раньше здесь использовалась TextCollection из NLTK - она обертывает список документов и вычисляет
+    # tf_idf, но для каждого слова заново просматривает все документы. TfidfIndex считает те же оценки,
+    # собирая частоты документов за один проход, и возвращает разреженную матрицу со словарем
+    index = TfidfIndex()
+    vectors = index.fit_transform(corpus)
 
-    for doc in corpus:
+    for doc, row in zip(corpus, vectors):
+        scores = dict(zip(row.indices, row.data))
         yield {
-            term: round(texts.tf_idf(term, doc), 3)
+            term: round(float(scores[index.vocabulary_[term]]), 3)
             for term in doc
         }
 
@@ -157,49 +153,74 @@ def scikit_tfidf_vectorize(corpus):
     return corpus
 
 
-def gensim_vectorize(corpus):
-    """Реализует базовую частотную векторизацию (используем Gensim)"""
+def gensim_bow_corpus(corpus, n_jobs=None, stream=False):
+    """
+    Лексемизирует корпус один раз и возвращает словарь Dictionary и частотные векторы документов.
 
-    tokenized_corpus = [tokenize(doc) for doc in corpus]
-    # Создаем объект словаря Dictionary отображающий лексемы в индексы в порядке их следования в документе
-    # т.е. в id2word будет словарь документа корпуса - ['грил', 'для', 'жарк', 'и', 'идеальн']
-    id2word = gensim.corpora.Dictionary(tokenized_corpus)
+    Документы корпуса - строки или уже выделенные лексемы (см. StemmingTokenizer.tokenize_document).
+    При stream=False лексемизированный корпус держится в памяти, а векторы возвращаются списком.
+    При stream=True корпус может быть любым итерируемым объектом (в т.ч. генератором): словарь
+    пополняется по мере чтения документов, сами документы сохраняются в виде идентификаторов лексем
+    во временном TokenIdStore, а векторы возвращаются генератором, читающим это хранилище.
+    """
 
-    # повторно создаем генератор, т.е. id2word его израсходовал
-    tokenized_corpus = [tokenize(doc) for doc in corpus]
-    # doc2bow - принимает лексимизированный документ и возвращает матрицу кортежей (id,count), где id -
-    # идентификатор лексемы в словаре
-    vectors = [id2word.doc2bow(doc) for doc in tokenized_corpus]
+    tokenized_corpus = TOKENIZER.tokenize_many(corpus, n_jobs)
 
-    return vectors
+    if not stream:
+        tokenized_corpus = list(tokenized_corpus)
+        # Создаем объект словаря Dictionary отображающий лексемы в индексы в порядке их следования в документе
+        # т.е. в id2word будет словарь документа корпуса - ['грил', 'для', 'жарк', 'и', 'идеальн']
+        id2word = gensim.corpora.Dictionary(tokenized_corpus)
 
+        # doc2bow - принимает лексимизированный документ и возвращает матрицу кортежей (id,count), где id -
+        # идентификатор лексемы в словаре
+        return id2word, [id2word.doc2bow(doc) for doc in tokenized_corpus]
 
-def gensim_logical_vectorize(corpus):
-    """Реализует логическую векторизацию (прямое кодирование, Gensim)"""
+    id2word = gensim.corpora.Dictionary()
+    store = TokenIdStore()
+    for doc in tokenized_corpus:
+        # allow_update добавляет новые лексемы и обновляет частоты документов. Идентификаторы уже
+        # добавленных лексем при этом не меняются, поэтому их можно сохранить сразу
+        id2word.doc2bow(doc, allow_update=True)
+        store.append(id2word.token2id[token] for token in doc)
 
-    tokenized_corpus = [tokenize(doc) for doc in corpus]
-    id2word = gensim.corpora.Dictionary(tokenized_corpus)
+    return id2word, stored_bows(store)
 
-    tokenized_corpus = [tokenize(doc) for doc in corpus]
-    vectors = [
-        [(token[0], 1) for token in id2word.doc2bow(doc)]
-        for doc in tokenized_corpus
-    ]
+
+def stored_bows(store):
+    """Генератор векторов (id,count) документов из TokenIdStore, хранилище закрывается по окончании"""
+
+    with store:
+        for ids in store:
+            # doc2bow возвращает пары, упорядоченные по идентификатору - сохраняем тот же порядок
+            yield sorted(Counter(ids).items())
+
+
+def gensim_vectorize(corpus, n_jobs=None, stream=False):
+    """Реализует базовую частотную векторизацию (используем Gensim)"""
+
+    id2word, vectors = gensim_bow_corpus(corpus, n_jobs, stream)
 
     return vectors
 
 
-def gensim_tfidf_vectorize(corpus):
+def gensim_logical_vectorize(corpus, n_jobs=None, stream=False):
+    """Реализует логическую векторизацию (прямое кодирование, Gensim)"""
+
+    id2word, vectors = gensim_bow_corpus(corpus, n_jobs, stream)
+    vectors = ([(token[0], 1) for token in vector] for vector in vectors)
+
+    return vectors if stream else list(vectors)
+
+
+def gensim_tfidf_vectorize(corpus, n_jobs=None, stream=False):
     """Реализует TF-IDF кодирование с помощью Gensum"""
 
-    tokenized_corpus = [tokenize(doc) for doc in corpus]
-    lexicon = gensim.corpora.Dictionary(tokenized_corpus)
+    lexicon, vectors = gensim_bow_corpus(corpus, n_jobs, stream)
     tfidf = gensim.models.TfidfModel(dictionary=lexicon, normalize=True)
+    vectors = (tfidf[vector] for vector in vectors)
 
-    tokenized_corpus = [tokenize(doc) for doc in corpus]
-    vectors = [tfidf[lexicon.doc2bow(doc)] for doc in tokenized_corpus]
-
-    return vectors
+    return vectors if stream else list(vectors)
 
 
 def print_vectors(vectors):
@@ -208,41 +229,41 @@ def print_vectors(vectors):
         print()
 
 
-corpus = [
-    "Идеально для оладий подходят молоденькие кабачки и цуккини. Для жарки кабачков используем масло и гриль.",
-    "В сковороду выложить фарш и обжарить на среднем огне, до готовности, постоянно разминая деревянной лопаткой, чтобы разбить крупные комки.",
-    "Вкусный и полезный ужин из запеченных кабачков с фаршем, помидорами и сыром, любителям жаркого!"
-]
-
-types = {
-    'NLTK vectorizer': {
-        'frequency type': nltk_vectorize,
-        'logical type': nltk_logical_vectorize,
-        'TF-IDF': nltk_tfidf_vectorize
-
-    },
-    'Scikit-Learn vectorizer': {
-        'frequency type': scikit_vectorize,
-        'logical type': scikit_logical_vectorize,
-        'TF-IDF': scikit_tfidf_vectorize
-    },
-    'Gensim vectorizer': {
-        'frequency type': gensim_vectorize,
-        'logical_type': gensim_logical_vectorize,
-        'TF-IDF': gensim_tfidf_vectorize
+if __name__ == '__main__':
+    corpus = [
+        "Идеально для оладий подходят молоденькие кабачки и цуккини. Для жарки кабачков используем масло и гриль.",
+        "В сковороду выложить фарш и обжарить на среднем огне, до готовности, постоянно разминая деревянной лопаткой, чтобы разбить крупные комки.",
+        "Вкусный и полезный ужин из запеченных кабачков с фаршем, помидорами и сыром, любителям жаркого!"
+    ]
+
+    types = {
+        'NLTK vectorizer': {
+            'frequency type': nltk_vectorize,
+            'logical type': nltk_logical_vectorize,
+            'TF-IDF': nltk_tfidf_vectorize
+
+        },
+        'Scikit-Learn vectorizer': {
+            'frequency type': scikit_vectorize,
+            'logical type': scikit_logical_vectorize,
+            'TF-IDF': scikit_tfidf_vectorize
+        },
+        'Gensim vectorizer': {
+            'frequency type': gensim_vectorize,
+            'logical_type': gensim_logical_vectorize,
+            'TF-IDF': gensim_tfidf_vectorize
+        }
     }
-}
-
-
-# Тестируем написанные выше методы векторизации
-for vectorizer_name, vectorizers in types.items():
-    print(vectorizer_name)
-    for vectorizer_type, vectorizer_func in vectorizers.items():
-        print(vectorizer_type)
-        if vectorizer_name == 'NLTK vectorizer' and vectorizer_type != 'TF-IDF':
-            # Применяем функцию векторизации ко всем документам в корпусе с помощью map
-            vectors = map(vectorizer_func, corpus)
-            print_vectors(vectors)
-        else:
-            vectors = vectorizer_func(corpus)
-            print_vectors(vectors)
+
+    # Тестируем написанные выше методы векторизации
+    for vectorizer_name, vectorizers in types.items():
+        print(vectorizer_name)
+        for vectorizer_type, vectorizer_func in vectorizers.items():
+            print(vectorizer_type)
+            if vectorizer_name == 'NLTK vectorizer' and vectorizer_type != 'TF-IDF':
+                # Применяем функцию векторизации ко всем документам в корпусе с помощью map
+                vectors = map(vectorizer_func, corpus)
+                print_vectors(vectors)
+            else:
+                vectors = vectorizer_func(corpus)
+                print_vectors(vectors)
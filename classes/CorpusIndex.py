@@ -0,0 +1,177 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Сохраненный список файлов и категорий корпуса для быстрого создания объектов чтения.
+
+CorpusReader из NLTK при создании обходит весь корень корпуса и проверяет каждый путь шаблоном
+fileids, а CategorizedCorpusReader затем применяет шаблон категорий к каждому файлу. На большом
+корпусе (особенно на сетевом диске) это занимает минуты еще до чтения первого документа.
+
+CorpusIndex сохраняет результат такого обхода в JSON: отсортированный список файлов, индекс
+категория -> файлы и время изменения каждого каталога корпуса. Добавление, удаление или
+переименование файла меняет mtime его каталога, поэтому для проверки актуальности достаточно
+одного stat на каталог, а не обхода всех файлов. Если индекс устарел или построен по другим
+шаблонам, он строится заново и перезаписывается.
+
+Изменение содержимого файла mtime каталога не меняет, но на список файлов и не влияет.
+
+По умолчанию индекс хранится вне корпуса, в каталоге кешей CACHE_ROOT (см. config), под именем из хеша
+корня и шаблонов. Корень корпуса проверяется не по mtime, а по списку имен в нем без служебных файлов:
+в корень обработанного корпуса Preprocessor на каждом прогоне перезаписывает манифест, и его mtime
+меняется, хотя список документов остается прежним. Так же проверяется каталог индекса, если индекс
+явно положен внутрь корпуса - запись самого индекса меняет mtime этого каталога.
+"""
+
+from classes.Manifest import JOURNAL_NAME, MANIFEST_NAME, atomic_open
+from config import CACHE_ROOT
+import hashlib
+import json
+import os
+import re
+
+INDEX_VERSION = 1
+
+# Служебные файлы, которые пишутся в корень корпуса, но не входят в список его документов
+SERVICE_NAMES = (MANIFEST_NAME, JOURNAL_NAME)
+
+
+def default_path(root, pattern, cat_pattern):
+    """Путь к индексу корпуса в каталоге кешей: имя - хеш абсолютного пути корня и шаблонов"""
+
+    key = '\0'.join((os.path.abspath(root), pattern, cat_pattern))
+    return os.path.join(CACHE_ROOT, 'corpus_index', hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+
+class CorpusIndex(object):
+
+    def __init__(self, root, pattern, cat_pattern, path=None):
+        """
+        root - корень корпуса, pattern - шаблон файлов (как fileids у CorpusReader),
+        cat_pattern - шаблон категорий, path - файл индекса (по умолчанию - в каталоге кешей, см. default_path).
+        """
+
+        self.root = root
+        self.pattern = pattern
+        self.cat_pattern = cat_pattern
+        self.path = path or default_path(root, pattern, cat_pattern)
+
+        # Каталоги, которые проверяются по списку имен: корень и каталог индекса (если он внутри корпуса)
+        home = os.path.relpath(os.path.dirname(os.path.abspath(self.path)), os.path.abspath(root))
+        self.listed = {os.curdir, home}
+        self.ignored = SERVICE_NAMES + (os.path.basename(self.path),)
+
+    def listing(self, dirname):
+        """Имена в каталоге, кроме индекса, служебных файлов корпуса и их временных файлов"""
+
+        return sorted(entry for entry in os.listdir(dirname)
+                      if not any(entry.startswith(name) or entry.startswith('.' + name) for name in self.ignored))
+
+    def scan(self):
+        """
+        Обходит корпус так же, как find_corpus_fileids из NLTK.
+
+        Возвращает словарь каталог -> mtime в наносекундах (для каталогов из listed - список имен, см. listing),
+        пути относительно корня, и отсортированный список файлов.
+        """
+
+        regexp = re.compile(self.pattern + '$')
+        dirs = {}
+        fileids = []
+
+        for dirname, subdirs, names in os.walk(self.root):
+            subdirs[:] = [subdir for subdir in subdirs if subdir != '.svn']
+
+            relpath = os.path.relpath(dirname, self.root)
+            dirs[relpath] = self.listing(dirname) if relpath in self.listed else os.stat(dirname).st_mtime_ns
+
+            prefix = '' if relpath == os.curdir else relpath.replace(os.sep, '/') + '/'
+            fileids.extend(prefix + name for name in names if regexp.match(prefix + name))
+
+        fileids.sort()
+        return dirs, fileids
+
+    def build(self):
+        """Строит индекс обходом корпуса и сохраняет его (если каталог индекса недоступен для записи - только строит)"""
+
+        dirs, fileids = self.scan()
+
+        cat_regexp = re.compile(self.cat_pattern)
+        categories = {}
+        for i, fileid in enumerate(fileids):
+            categories.setdefault(cat_regexp.match(fileid).group(1), []).append(i)
+
+        data = {
+            'version': INDEX_VERSION,
+            'pattern': self.pattern,
+            'cat_pattern': self.cat_pattern,
+            'dirs': dirs,
+            'fileids': fileids,
+            'categories': categories,
+        }
+
+        try:
+            parent = os.path.dirname(self.path)
+            if parent and not os.path.exists(parent):
+                os.makedirs(parent)
+            with atomic_open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        except OSError as e:
+            print("Не удалось сохранить индекс корпуса {}: {}".format(self.path, e))
+
+        return data
+
+    def read(self):
+        """Возвращает сохраненный индекс или None, если его нет или он не читается"""
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def fresh(self, data):
+        """Проверяет, что индекс построен по тем же шаблонам и ни один каталог корпуса не менялся"""
+
+        if data is None:
+            return False
+
+        if (data.get('version'), data.get('pattern'), data.get('cat_pattern')) != \
+                (INDEX_VERSION, self.pattern, self.cat_pattern):
+            return False
+
+        for relpath, mtime in data['dirs'].items():
+            dirname = os.path.join(self.root, relpath)
+            try:
+                if isinstance(mtime, list):
+                    if self.listing(dirname) != mtime:
+                        return False
+                elif os.stat(dirname).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+
+        return True
+
+    def load(self):
+        """Возвращает актуальный индекс, при необходимости перестраивая его"""
+
+        data = self.read()
+        if not self.fresh(data):
+            data = self.build()
+
+        return data
+
+    def entries(self):
+        """
+        Возвращает отсортированный список файлов и словарь категория -> отсортированный список ее файлов.
+        """
+
+        data = self.load()
+        fileids = data['fileids']
+        categories = {
+            category: [fileids[i] for i in positions]
+            for category, positions in data['categories'].items()
+        }
+
+        return fileids, categories
@@ -2,19 +2,46 @@
 # -*- coding: utf-8 -*-
 
 from nltk.corpus.reader.api import (CorpusReader, CategorizedCorpusReader)
-from nltk import (sent_tokenize, wordpunct_tokenize, pos_tag, download, FreqDist)
-download('averaged_perceptron_tagger')
-download('averaged_perceptron_tagger_ru')
+from nltk import (sent_tokenize, wordpunct_tokenize, FreqDist)
 from readability.readability import (Unparseable, Document as Paper)
+from classes.CorpusIndex import CorpusIndex
+from classes.DocumentRecord import DocumentRecord
+from classes.Instrumentation import instrumented, text_bytes
+from classes.Manifest import atomic_open, file_hash
+from classes.Parallel import imap
+from classes.Resources import require
+from classes.Schedule import file_sizes, find_outliers, order_by_size
+from classes.Tagger import Tagger
+from collections import defaultdict
+from functools import partial
 import codecs
+import hashlib
 import os
 import bs4
+import pickle
 import re
 import time
 
 CAT_PATTERN = r'([\w_\s]+)/.*'
 DOC_PATTERN = r'(?!\.)[\w_\s]+/[\w\s\d\-]+\.txt'
 TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'h7', 'p', 'li']  # теги для извлечения абзацев
+ENGINES = ('bs4', 'lxml')  # способы извлечения абзацев из очищенного HTML
+
+
+class TreePaper(Paper):
+    """
+    Document из readability, сохраняющий очищенное lxml-дерево статьи.
+
+    summary() все так же возвращает строку (ее длина нужна readability, чтобы решить, не повторить
+    ли разбор менее агрессивно), но дерево статьи остается доступным в атрибуте article, и абзацы
+    можно брать прямо из него, не разбирая HTML повторно.
+    """
+
+    article = None
+
+    def get_clean_html(self):
+        self.article = self.html
+        return super().get_clean_html()
 
 
 class HTMLCorpusReader(CategorizedCorpusReader, CorpusReader):
@@ -23,19 +50,83 @@ class HTMLCorpusReader(CategorizedCorpusReader, CorpusReader):
     возможностей предварительной обработки данных
     """
 
-    def __init__(self, root, fileids=DOC_PATTERN, encoding='utf-8', tags=TAGS, **kwargs):
-        """Инициализирует объект чтения корпуса."""
+    # Замеры по этапам (см. Instrumentation), по умолчанию выключены
+    instrument = None
+    # Категория -> отсортированный список ее файлов, если файлы взяты из готового индекса (см. init_from_index)
+    category_fileids = None
+
+    def __init__(self, root, fileids=DOC_PATTERN, encoding='utf-8', tags=TAGS, engine='bs4', tagger=None, index=False,
+                 **kwargs):
+        """
+        Инициализирует объект чтения корпуса.
+
+        engine - способ извлечения абзацев: 'bs4' - повторный разбор очищенного HTML через BeautifulSoup,
+        'lxml' - обход дерева, которое уже построил readability (один разбор документа и без bs4).
+        tagger - объект Tagger для разметки частей речи, по умолчанию создается свой.
+        index - брать файлы и категории из сохраненного индекса корпуса (см. CorpusIndex) вместо обхода
+        корня: True - индекс в каталоге кешей (см. CorpusIndex), строка - путь к файлу индекса.
+        """
+
+        if engine not in ENGINES:
+            raise ValueError("Неизвестный способ извлечения абзацев: {}. Доступны: {}".format(engine, ENGINES))
+
+        self.init_corpus(root, fileids, encoding, index, kwargs)
+
+        # Сохранить теги, подлежащие извлечению
+        self.tags = tags
+        self.engine = engine
+        self.tagger = tagger or Tagger()
+
+    def init_corpus(self, root, fileids, encoding, index, kwargs):
+        """
+        Инициализирует объекты чтения NLTK по шаблонам fileids и категорий из kwargs,
+        а при заданном index - по сохраненному индексу корпуса.
+        """
 
         # Если шаблон категорий не был передан в класс явно - добавляем его
         if not any(key.startswith('cat_') for key in kwargs.keys()):
             kwargs['cat_pattern'] = CAT_PATTERN
 
-        # Инициализируем объекты чтения корпуса из NLTK
-        CategorizedCorpusReader.__init__(self, kwargs)
+        if not index:
+            # Инициализируем объекты чтения корпуса из NLTK
+            CategorizedCorpusReader.__init__(self, kwargs)
+            CorpusReader.__init__(self, root, fileids, encoding)
+            return
+
+        if not isinstance(fileids, str) or list(kwargs.keys()) != ['cat_pattern']:
+            raise ValueError("Индекс корпуса строится только по шаблону файлов и шаблону категорий cat_pattern")
+
+        corpus_index = CorpusIndex(root, fileids, kwargs['cat_pattern'], None if index is True else index)
+        self.init_from_index(root, *corpus_index.entries(), encoding=encoding)
+
+    def init_from_index(self, root, fileids, categories, encoding='utf-8'):
+        """
+        Инициализирует объекты чтения NLTK по готовому списку файлов и их категорий.
+
+        В отличие от шаблонов DOC_PATTERN/CAT_PATTERN, не требует обхода корня корпуса и применения
+        регулярного выражения к каждому файлу. categories - категория для каждого из fileids
+        или словарь категория -> файлы.
+        """
+
+        CategorizedCorpusReader.__init__(self, {'cat_map': {}})
         CorpusReader.__init__(self, root, fileids, encoding)
 
-        # Сохранить теги, подлежащие извлечению
-        self.tags = tags
+        if not isinstance(categories, dict):
+            members = defaultdict(list)
+            for fileid, category in zip(fileids, categories):
+                members[category].append(fileid)
+            categories = members
+
+        # Заполняем отображения файл -> категории и категория -> файлы сразу, а не при первом обращении
+        self._f2c = defaultdict(set)
+        self._c2f = defaultdict(set)
+        for category, members in categories.items():
+            self._c2f[category] = set(members)
+            for fileid in members:
+                self._f2c[fileid].add(category)
+
+        # Списки файлов по категориям для resolve(): CategorizedCorpusReader сортирует их на каждый вызов
+        self.category_fileids = {category: sorted(members) for category, members in categories.items()}
 
     def resolve(self, fileids, categories):
         """Фильтрация файлов корпуса на диске."""
@@ -43,12 +134,24 @@ class HTMLCorpusReader(CategorizedCorpusReader, CorpusReader):
         if fileids is not None and categories is not None:
             raise ValueError("Укажите fileids или categories, но не то и другое разом")
 
+        if categories is not None and self.category_fileids is not None:
+            # Файлы категорий уже разложены по отсортированным спискам (см. init_from_index)
+            if isinstance(categories, str):
+                categories = [categories]
+            for category in categories:
+                if category not in self.category_fileids:
+                    raise ValueError("Категория {} не найдена".format(category))
+            if len(categories) == 1:
+                return list(self.category_fileids[categories[0]])
+            return sorted(set().union(*(self.category_fileids[category] for category in categories)))
+
         if categories is not None:
             # вызываем метод CorpusReader-а, возвращающего файлы переданной категории
             return self.fileids(categories)
 
         return fileids
 
+    @instrumented('docs', text_bytes)
     def docs(self, fileids=None, categories=None):
         """Возвращает полный текст документа"""
 
@@ -74,28 +177,124 @@ class HTMLCorpusReader(CategorizedCorpusReader, CorpusReader):
         for path in self.abspaths(fileids):
             yield path, os.path.getsize(path)
 
-    def describe(self, fileids=None, categories=None):
-        """Выполняет обход корпуса и возвращает словрь с оценками, описывающими состояние корпуса"""
+    def describe_key(self, fileid):
+        """
+        Ключ кеша статистики файла: хеш содержимого, способ извлечения абзацев и набор тегов.
+
+        От engine и tags зависит, какие абзацы будут извлечены, поэтому при их смене статистика считается заново.
+        """
+
+        settings = '{}:{}'.format(self.engine, ','.join(sorted(set(self.tags))))
+        return '{}-{}'.format(file_hash(self.abspath(fileid)), hashlib.sha1(settings.encode('utf-8')).hexdigest()[:12])
+
+    def describe_file(self, fileid, cache=None):
+        """
+        Считает частичную статистику одного файла: число абзацев, предложений, слов и множество лексем.
+
+        Если задан каталог cache, статистика сохраняется в нем под ключом из хеша содержимого файла
+        и настроек извлечения абзацев (см. describe_key), и при повторном вызове для неизменившегося файла
+        с теми же настройками берется оттуда без разбора HTML.
+        Возвращает кортеж (статистика, время стадий в секундах, взята ли статистика из кеша).
+        """
+
+        timings = {}
+        target = None
+
+        if cache is not None:
+            started = time.time()
+            target = os.path.join(cache, self.describe_key(fileid) + '.pickle')
+            timings['hash'] = time.time() - started
+
+            if os.path.exists(target):
+                with open(target, 'rb') as f:
+                    return pickle.load(f), timings, True
+
+        stats = {'paras': 0, 'sents': 0, 'words': 0, 'vocab': set()}
+        record = DocumentRecord(self, fileid)
+
+        # Извлечение абзацев: readability и bs4
+        started = time.time()
+        stats['paras'] = len(record.paras)
+        timings['paras'] = time.time() - started
+
+        # Выделение предложений и лексем
+        started = time.time()
+        for para in record.words:
+            stats['sents'] += len(para)
+
+            for words in para:
+                stats['words'] += len(words)
+                stats['vocab'].update(words)
+        timings['tokenize'] = time.time() - started
+
+        if target is not None:
+            with atomic_open(target, 'wb') as f:
+                pickle.dump(stats, f, pickle.HIGHEST_PROTOCOL)
+
+        return stats, timings, False
+
+    def describe_entry(self, fileid, cache=None):
+        """Как describe_file(), но первым элементом кортежа возвращает fileid"""
+
+        return (fileid,) + self.describe_file(fileid, cache)
+
+    def describe(self, fileids=None, categories=None, n_jobs=None, cache=None, largest_first=True, outliers=10):
+        """
+        Выполняет обход корпуса и возвращает словрь с оценками, описывающими состояние корпуса
+
+        Обход устроен как map-reduce: describe_file() считает статистику каждого файла отдельно
+        (при n_jobs > 1 - в пуле процессов), после чего частичные статистики складываются.
+        cache - каталог для кеша частичных статистик, тогда при повторном описании корпуса
+        заново разбираются только изменившиеся файлы.
+
+        Кроме общего времени secs возвращается stages - время по стадиям: hash, paras и tokenize
+        суммируются по всем файлам (во всех процессах), reduce - время слияния в текущем процессе.
+
+        largest_first - отдавать файлы в пул от больших к меньшим, чтобы в конце обхода процессы
+        не простаивали из-за одного большого файла. В outliers возвращается не больше outliers файлов,
+        заметно превосходящих типичный по размеру или времени обработки (см. Schedule.find_outliers).
+        """
         started = time.time()
+        require('punkt')
+
+        # Определяем файлы для обхода
+        fileids = self.resolve(fileids, categories) or self.fileids()
+        if isinstance(fileids, str):
+            fileids = [fileids]
+
+        if cache is not None and not os.path.exists(cache):
+            os.makedirs(cache)
+
+        sizes = file_sizes(self, fileids)
+        if largest_first:
+            fileids = order_by_size(fileids, sizes)
+        rows = []
 
         # Структуры для подсчета
         counts = FreqDist()
-        tokens = FreqDist()
+        tokens = set()
+        stages = {'hash': 0.0, 'paras': 0.0, 'tokenize': 0.0, 'reduce': 0.0}
+        cached = 0
+
+        # Считаем статистику по файлам и сливаем ее по мере готовности
+        describe_entry = partial(self.describe_entry, cache=cache)
+        for fileid, stats, timings, from_cache in imap(describe_entry, fileids, n_jobs, ordered=False):
+            reduce_started = time.time()
+            rows.append({'fileid': fileid, 'size': sizes[fileid], 'secs': sum(timings.values())})
 
-        # Выполняем обход абзавцев, выделяем лексемы и подсчитываем их
-        for para in self.paras(fileids, categories):
-            counts['paras'] += 1
+            for key in ('paras', 'sents', 'words'):
+                counts[key] += stats[key]
+            tokens.update(stats['vocab'])
 
-            for sent in sent_tokenize(para):
-                counts['sents'] += 1
+            for stage, secs in timings.items():
+                stages[stage] += secs
+            cached += from_cache
 
-                for word in wordpunct_tokenize(sent):
-                    counts['words'] += 1
-                    tokens[word] += 1
+            stages['reduce'] += time.time() - reduce_started
 
         # Определяем число файлов и категорий в корпусе
-        n_fileids = len(self.resolve(fileids, categories) or self.fileids())
-        n_topics = len(self.categories(self.resolve(fileids, categories)))
+        n_fileids = len(fileids)
+        n_topics = len(self.categories(fileids))
 
         # Возвращаем структуру данных с информацией
         return {
@@ -108,9 +307,26 @@ class HTMLCorpusReader(CategorizedCorpusReader, CorpusReader):
             'lexdiv': float(counts['words']) / float(len(tokens)),
             'ppdoc': float(counts['paras']) / float(n_fileids),
             'sppar': float(counts['sents']) / float(counts['paras']),
-            'secs': time.time() - started
+            'cached': cached,
+            'secs': time.time() - started,
+            'stages': stages,
+            'outliers': find_outliers(rows, outliers)
         }
 
+    def records(self, fileids=None, categories=None):
+        """
+        Возвращает для каждого документа DocumentRecord - запись, из которой за один разбор документа
+        можно получить абзацы, предложения, лексемы и теги (вычисляются лениво, при первом обращении).
+        """
+
+        fileids = self.resolve(fileids, categories) or self.fileids()
+        if isinstance(fileids, str):
+            fileids = [fileids]
+
+        for fileid in fileids:
+            yield DocumentRecord(self, fileid)
+
+    @instrumented('html', text_bytes)
     def html(self, fileids=None, categories=None):
         """Возвращает содержимое HTML каждого документа, очищая его с помощью readability."""
 
@@ -121,26 +337,50 @@ class HTMLCorpusReader(CategorizedCorpusReader, CorpusReader):
                 print("Невозможно распарсить HTML: {}".format(e))
                 continue
 
+    @instrumented('trees')
+    def trees(self, fileids=None, categories=None):
+        """Возвращает очищенное readability lxml-дерево статьи каждого документа."""
+
+        for doc in self.docs(fileids, categories):
+            paper = TreePaper(doc)
+            try:
+                paper.summary()
+            except Unparseable as e:
+                print("Невозможно распарсить HTML: {}".format(e))
+                continue
+            yield paper.article
+
+    @instrumented('paras', text_bytes)
     def paras(self, fileids=None, categories=None):
         """
         С использованием BeautifulSoup выделяет абзацы из HTML.
 
         Предполагается, что ведется работа с исходным не аннотированным корпусом.
+        При engine='lxml' абзацы берутся из дерева readability без повторного разбора и bs4.
         """
 
+        if self.engine == 'lxml':
+            for tree in self.trees(fileids, categories):
+                for element in tree.iter(*self.tags):
+                    yield element.text_content()
+            return
+
         for html in self.html(fileids, categories):
             soup = bs4.BeautifulSoup(html, 'lxml')  # указываем, что разбор происходить должен lxml-парсером
-            for element in soup.find_all(TAGS):
+            for element in soup.find_all(self.tags):
                 yield element.text
             soup.decompose()  # освобождаем память
 
+    @instrumented('sents', text_bytes)
     def sents(self, fileids=None, categories=None):
         """Выделяет предложения из абзацев с помощью NLTK функции sent_tokenize"""
 
+        require('punkt')
         for paragraph in self.paras(fileids, categories):
             for sentence in sent_tokenize(paragraph):
                 yield sentence
 
+    @instrumented('words', text_bytes)
     def words(self, fileids=None, categories=None):
         """Выделяет слова из предложения с помощью NLTK функции wordpunct_tokenize"""
 
@@ -148,10 +388,14 @@ class HTMLCorpusReader(CategorizedCorpusReader, CorpusReader):
             for token in wordpunct_tokenize(sentence):
                 yield token
 
+    @instrumented('tokenize')
     def tokenize(self, fileids=None, categories=None):
         """
         Сегментирует, лексемизирует и маркирует документ в корпусе с помощью NLTK фун-ии pos_tag
 
+        Разметка идет через self.tagger: модель загружается один раз, предложения абзаца размечаются
+        одной пачкой, а повторяющиеся предложения берутся из кеша.
+
         Основное правило расшифроки тегов частей речи, которые возвращает pos_tag на АНГЛИЙСКОМ:
         N - если с N начинается тег, то это существительное
         V - глагол
@@ -264,4 +508,4 @@ class HTMLCorpusReader(CategorizedCorpusReader, CorpusReader):
         """
 
         for paragraph in self.paras(fileids, categories):
-            yield [pos_tag(wordpunct_tokenize(sent), lang='rus') for sent in sent_tokenize(paragraph)]
+            yield self.tagger.tag_paragraph(paragraph)
@@ -0,0 +1,46 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Запись об одном документе корпуса для обработки за один проход.
+
+describe, sents, words и tokenize у HTMLCorpusReader каждый раз заново читают файл, чистят его
+readability и разбирают HTML. Запись же разбирает документ один раз, а предложения, лексемы и теги
+вычисляет из уже извлеченных абзацев - лениво, только при первом обращении, и запоминает.
+
+Все представления сохраняют деление на абзацы:
+paras - список абзацев (строк);
+sents - для каждого абзаца список предложений;
+words - для каждого абзаца для каждого предложения список лексем;
+tagged - то же, но с кортежами (token, tag), как у HTMLCorpusReader.tokenize.
+"""
+
+from functools import cached_property
+from nltk import (sent_tokenize, wordpunct_tokenize)
+from classes.Resources import require
+
+
+class DocumentRecord(object):
+
+    def __init__(self, corpus, fileid):
+        self.corpus = corpus
+        self.fileid = fileid
+
+    @cached_property
+    def paras(self):
+        """Абзацы документа - единственное место, где документ читается и разбирается"""
+
+        return list(self.corpus.paras(fileids=self.fileid))
+
+    @cached_property
+    def sents(self):
+        require('punkt')
+        return [sent_tokenize(para) for para in self.paras]
+
+    @cached_property
+    def words(self):
+        return [[wordpunct_tokenize(sent) for sent in para] for para in self.sents]
+
+    @cached_property
+    def tagged(self):
+        return [self.corpus.tagger.tag_sents(para) for para in self.words]
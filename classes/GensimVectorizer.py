@@ -9,36 +9,163 @@
 используется методом transform().
 Объект Dictionary (например, TfidfModel) можно сохранить на диск и загрузить с диска, поэтому текущий преобразователь
 тоже будет пользоваться такой возможностью. Путь сохранения будет определяться при создании экземпляра (инит).
+
+path - каталог словаря: каждое сохранение пишется в новый каталог версии (v00001, v00002, ...), а файл CURRENT
+заменяется атомарно последним (см. Manifest.publish_version), поэтому загрузка никогда не видит наполовину
+записанный словарь. Словарь, сохраненный прежде одним файлом по пути path, тоже загружается.
+
+Результат transform задается параметром output: 'dense' - генератор плотных векторов размером со словарь,
+'sparse' - одна разреженная матрица CSR, занимающая память пропорционально числу ненулевых элементов.
 """
 
+from array import array
 import os
-from gensim.corpora import Dictionary
+import numpy as np
+from gensim.corpora import Dictionary, HashDictionary
 from gensim.matutils import sparse2full
+from scipy.sparse import csr_matrix
 from sklearn.base import BaseEstimator, TransformerMixin
+from classes.Manifest import atomic_open, current_version, new_version, publish_version
+from classes.MappedVocabulary import MappedVocabulary
+
+OUTPUTS = ('dense', 'sparse')
+DICTIONARY_NAME = 'dictionary'  # Dictionary в каталоге версии
+VOCAB_NAME = 'vocab'  # MappedVocabulary в каталоге версии
 
 
 class GensimVectorizer(BaseEstimator, TransformerMixin):
 
-    def __init__(self, path=None):
+    def __init__(self, path=None, output='dense', dtype=np.float32, no_below=1, no_above=1.0, keep_n=None,
+                 prune_at=2000000, hashing=False, n_features=2 ** 20, mmap=False):
+        """
+        output - 'dense' или 'sparse' (см. transform), dtype - тип значений результата
+        (например, np.float32 или np.int32 для частот).
+
+        no_below - отбросить слова, встречающиеся меньше чем в no_below документах,
+        no_above - отбросить слова, встречающиеся больше чем в доле no_above документов,
+        keep_n - оставить не больше keep_n самых частых из оставшихся слов (None - все),
+        prune_at - сколько слов держать в словаре во время прохода (None - без ограничения).
+
+        hashing=True - вместо словаря использовать HashDictionary на n_features столбцов.
+        Такой словарь не обучается и не сохраняется на диск.
+
+        mmap=True - при сохранении записывать в ту же версию еще и MappedVocabulary,
+        а при загрузке открывать его вместо Dictionary (только для transform).
+        """
+
+        if output not in OUTPUTS:
+            raise ValueError("Неизвестный формат результата: {}. Допустимые: {}".format(output, ', '.join(OUTPUTS)))
+
         self.path = path
+        self.output = output
+        self.dtype = dtype
+        self.no_below = no_below
+        self.no_above = no_above
+        self.keep_n = keep_n
+        self.prune_at = prune_at
+        self.hashing = hashing
+        self.n_features = n_features
+        self.mmap = mmap
         self.id2word = None
         self.load()
 
     def load(self):
-        if os.path.exists(self.path):
-            self.id2word = Dictionary.load(self.path)
+        if self.hashing:
+            # debug=False - не запоминать, какие слова попали в каждый столбец
+            self.id2word = HashDictionary(id_range=self.n_features, debug=False)
+            return
+
+        version = self.version_path()
+        if self.mmap and version is not None and os.path.exists(os.path.join(version, VOCAB_NAME)):
+            self.id2word = MappedVocabulary(os.path.join(version, VOCAB_NAME))
+        else:
+            dictionary = self.dictionary_path()
+            if dictionary is not None:
+                self.id2word = Dictionary.load(dictionary)
+
+    def version_path(self):
+        """Каталог текущей версии словаря или None, если словарь не сохранялся по версиям"""
+
+        if self.path is None or not os.path.isdir(self.path):
+            return None
+
+        version = current_version(self.path)
+        return os.path.join(self.path, version) if version is not None else None
+
+    def dictionary_path(self):
+        """Файл текущего Dictionary (в версии или прежний одиночный файл) или None, если словаря нет"""
+
+        version = self.version_path()
+        if version is not None:
+            return os.path.join(version, DICTIONARY_NAME)
+        if self.path is not None and os.path.isfile(self.path):
+            return self.path
+        return None
 
     def save(self):
-        self.id2word.save(self.path)
+        """
+        Сохраняет Dictionary (а при mmap=True и MappedVocabulary) новой версией и публикует ее заменой CURRENT.
+
+        Словарь, сохраненный прежде одним файлом, заменяется каталогом версий.
+        """
+
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+        version = new_version(self.path)
+        path = os.path.join(self.path, version)
+
+        with atomic_open(os.path.join(path, DICTIONARY_NAME)) as f:
+            self.id2word.save(f)
+        if self.mmap:
+            MappedVocabulary.write(self.id2word, os.path.join(path, VOCAB_NAME))
+
+        publish_version(self.path, version)
+
+    def dictionary(self):
+        """Возвращает обучаемый Dictionary: текущий, загруженный с диска вместо MappedVocabulary или пустой"""
+
+        if isinstance(self.id2word, Dictionary):
+            return self.id2word
+
+        dictionary = self.dictionary_path()
+        if dictionary is not None:
+            return Dictionary.load(dictionary)
+        return Dictionary()
 
     def fit(self, documents, labels=None):
         """
         Конструирует объект Dictionary, передавая его конструктору лексемизированные и нормализованные документы.
 
         Экземпляр сразу сохраняется на диск для последующей загрузки без повторного обучения.
+        Словарь ограничивается параметрами prune_at, no_below, no_above и keep_n. В режиме hashing
+        обучать нечего - документы не читаются.
+        """
+
+        if self.hashing:
+            return self
+
+        self.id2word = Dictionary(documents, prune_at=self.prune_at)
+        if self.no_below > 1 or self.no_above < 1 or self.keep_n is not None:
+            self.id2word.filter_extremes(no_below=self.no_below, no_above=self.no_above, keep_n=self.keep_n)
+
+        self.save()
+        return self
+
+    def partial_fit(self, documents, labels=None):
+        """
+        Добавляет в словарь слова новых документов и обновляет частоты документов, после чего сохраняет словарь.
+
+        Словарь не сжимается и не фильтруется (prune_at, no_below, no_above и keep_n применяются только в fit),
+        поэтому идентификаторы уже известных слов не меняются и ранее полученные векторы остаются верными.
         """
 
-        self.id2word = Dictionary(documents)
+        if self.hashing:
+            return self
+
+        self.id2word = self.dictionary()
+        self.id2word.add_documents(documents, prune_at=None)
+
         self.save()
         return self
 
@@ -47,8 +174,36 @@ class GensimVectorizer(BaseEstimator, TransformerMixin):
         Вызывает метод Dictionary.doc2bow, возвращающий разреженное представление документа в виде списка
         кортежей (token_id, frequency). Чтобы такое представление не вызывало проблем у Scikit-Learn, используется
         далее sparse2full из Gensim для преобразования полученного представления в массив NumPy.
+
+        При output='sparse' вместо генератора плотных векторов возвращается матрица CSR (документы x словарь),
+        собранная за один проход по документам.
         """
 
+        if self.output == 'sparse':
+            return self.transform_sparse(documents)
+
+        return self.transform_dense(documents)
+
+    def transform_dense(self, documents):
         for document in documents:
             docvec = self.id2word.doc2bow(document)
-            yield sparse2full(docvec, len(self.id2word))
+            yield sparse2full(docvec, len(self.id2word)).astype(self.dtype, copy=False)
+
+    def transform_sparse(self, documents):
+        """Собирает матрицу CSR из векторов doc2bow: границы строк, номера столбцов и значения"""
+
+        indptr = array('q', [0])
+        indices = array('i')
+        data = array('d')
+
+        for document in documents:
+            for token_id, frequency in self.id2word.doc2bow(document):
+                indices.append(token_id)
+                data.append(frequency)
+            indptr.append(len(indices))
+
+        return csr_matrix(
+            (np.frombuffer(data, dtype=np.float64).astype(self.dtype, copy=False),
+             np.frombuffer(indices, dtype=np.int32), np.frombuffer(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, len(self.id2word))
+        )
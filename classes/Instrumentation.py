@@ -0,0 +1,227 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Замеры по этапам цепочки чтения и обработки корпуса.
+
+Методы HTMLCorpusReader вложены друг в друга (tokenize читает sents, те - paras, те - html, те - docs),
+поэтому cProfile показывает время каждого генератора вместе со всеми вложенными. Здесь каждый этап
+получает только собственное время: время, проведенное во вложенных инструментированных генераторах,
+вычитается и засчитывается им.
+
+Замеры включаются присваиванием объекта Instrumentation атрибуту instrument объекта чтения или
+препроцессора (по умолчанию None):
+
+    instrument = Instrumentation(progress=30)
+    reader.instrument = instrument
+    preprocessor.instrument = instrument
+
+Пока instrument равен None, декоратор instrumented возвращает генератор метода как есть - цена
+выключенных замеров - одна проверка атрибута на вызов метода, а не на элемент.
+
+Для каждого этапа считаются время, число элементов и их размер в байтах (utf-8), а для документов -
+время обработки, из которого держится список самых медленных. Время документа записывают и
+препроцессор (этап process), и методы чтения: внешний инструментированный метод (тот, который вызвал
+потребитель) - с учетом вложенных. Результат доступен как словарь
+(as_dict), JSON (to_json) и строка прогресса, которая при progress=N выводится не чаще раза в N секунд.
+
+Замеры ведутся в текущем процессе: при n_jobs > 1 этапы чтения выполняются в процессах пула и
+в счетчики не попадают, но время обработки документов препроцессор получает из процессов пула.
+"""
+
+from functools import wraps
+import heapq
+import json
+import sys
+import time
+
+
+def text_bytes(text):
+    return len(text.encode('utf-8'))
+
+
+def instrumented(stage, size=None):
+    """
+    Декоратор метода-генератора: при заданном self.instrument элементы генератора учитываются в этапе stage.
+
+    size(item) - размер элемента в байтах, None - размер не считается.
+
+    Метод принимает fileids и categories первыми аргументами, как методы CorpusReader. При включенных
+    замерах файлы разрешаются заранее (self.resolve) и метод вызывается для каждого файла отдельно,
+    чтобы время каждого документа попало в список самых медленных.
+    """
+
+    def decorate(method):
+        @wraps(method)
+        def wrapper(self, fileids=None, categories=None, *args, **kwargs):
+            if self.instrument is None:
+                return method(self, fileids, categories, *args, **kwargs)
+
+            # Пустой выбор (fileids=[] или категория без документов) остается пустым, как и без замеров
+            fileids = self.resolve(fileids, categories)
+            if fileids is None:
+                fileids = self.fileids()
+            if isinstance(fileids, str):
+                fileids = [fileids]
+
+            return self.instrument.iterate_files(
+                stage, fileids, lambda fileid: method(self, fileid, None, *args, **kwargs), size)
+
+        return wrapper
+
+    return decorate
+
+
+class Instrumentation(object):
+
+    def __init__(self, slowest=10, progress=None, stream=None):
+        """
+        slowest - сколько самых медленных документов помнить,
+        progress - интервал вывода строки прогресса в секундах (None - не выводить),
+        stream - куда выводить прогресс (по умолчанию sys.stderr).
+        """
+
+        self.slowest = slowest
+        self.progress = progress
+        self.stream = stream
+
+        self.started = time.perf_counter()
+        self.last_progress = self.started
+
+        # Этап -> [секунды, элементы, байты]
+        self.stages = {}
+        # Куча (секунды, fileid, этап) самых медленных документов
+        self.documents = []
+        # Время вложенных этапов, накопленное текущими вызовами next() (по одному на уровень вложенности)
+        self.stack = []
+
+    def __getstate__(self):
+        # Поток вывода не сериализуется (объект передается в процессы пула вместе с объектом чтения)
+        state = self.__dict__.copy()
+        state['stream'] = None
+        return state
+
+    def add(self, stage, secs, items=0, size=0):
+        """Добавляет к счетчикам этапа время, число элементов и байты"""
+
+        counters = self.stages.get(stage)
+        if counters is None:
+            counters = self.stages[stage] = [0.0, 0, 0]
+
+        counters[0] += secs
+        counters[1] += items
+        counters[2] += size
+
+        if self.progress is not None:
+            self.tick()
+
+    def document(self, fileid, secs, stage='document'):
+        """Учитывает время обработки документа в списке самых медленных"""
+
+        item = (secs, fileid, stage)
+        if len(self.documents) < self.slowest:
+            heapq.heappush(self.documents, item)
+        elif item > self.documents[0]:
+            heapq.heapreplace(self.documents, item)
+
+    def iterate(self, stage, items, size=None, fileid=None):
+        """
+        Генератор, повторяющий items и учитывающий в этапе stage собственное время каждого next().
+
+        Время, которое заняли вложенные инструментированные генераторы, засчитывается им, а не stage.
+        Время, пока потребитель обрабатывает элемент, не учитывается.
+
+        Если задан fileid и генератор внешний (его не читает другой инструментированный генератор),
+        полное время его next(), вместе с вложенными, учитывается как время документа fileid в этапе stage.
+        """
+
+        iterator = iter(items)
+        stack = self.stack
+        outer = not stack
+        total = 0.0
+
+        try:
+            while True:
+                nested = [0.0]
+                stack.append(nested)
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed = time.perf_counter() - started
+                    total += elapsed
+                    stack.pop()
+                    if stack:
+                        stack[-1][0] += elapsed
+                    self.add(stage, elapsed - nested[0])
+
+                self.add(stage, 0.0, 1, size(item) if size is not None else 0)
+                yield item
+        finally:
+            # Потребитель мог остановиться раньше - закрываем и исходный генератор
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+            if fileid is not None and outer:
+                self.document(fileid, total, stage)
+
+    def iterate_files(self, stage, fileids, items, size=None):
+        """Как iterate, но по файлам: items(fileid) возвращает элементы файла, время считается для каждого"""
+
+        for fileid in fileids:
+            yield from self.iterate(stage, items(fileid), size, fileid)
+
+    def as_dict(self):
+        """Счетчики этапов и самые медленные документы в виде словаря"""
+
+        stages = {}
+        for stage, (secs, items, size) in self.stages.items():
+            stages[stage] = {
+                'secs': round(secs, 4),
+                'items': items,
+                'bytes': size,
+                'items_per_sec': round(items / secs, 2) if secs else None,
+                'mb_per_sec': round(size / secs / 1024 ** 2, 3) if secs and size else None,
+            }
+
+        return {
+            'elapsed': round(time.perf_counter() - self.started, 4),
+            'stages': stages,
+            'slowest': [
+                {'fileid': fileid, 'stage': stage, 'secs': round(secs, 4)}
+                for secs, fileid, stage in sorted(self.documents, reverse=True)
+            ],
+        }
+
+    def to_json(self, path=None):
+        """Возвращает счетчики в JSON, а при заданном path - еще и записывает их в файл"""
+
+        data = json.dumps(self.as_dict(), ensure_ascii=False, indent=2)
+        if path is not None:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(data)
+
+        return data
+
+    def progress_line(self):
+        """Строка прогресса: общее время и для каждого этапа - элементы, мегабайты и собственное время"""
+
+        parts = ['[{:.1f} с]'.format(time.perf_counter() - self.started)]
+        for stage, (secs, items, size) in self.stages.items():
+            if size:
+                parts.append('{}: {} шт, {:.1f} МБ, {:.1f} с'.format(stage, items, size / 1024 ** 2, secs))
+            else:
+                parts.append('{}: {} шт, {:.1f} с'.format(stage, items, secs))
+
+        return ' | '.join(parts)
+
+    def tick(self):
+        """Выводит строку прогресса, если с прошлого вывода прошло progress секунд"""
+
+        now = time.perf_counter()
+        if now - self.last_progress >= self.progress:
+            self.last_progress = now
+            print(self.progress_line(), file=self.stream or sys.stderr)
@@ -0,0 +1,83 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Ограниченный по размеру кеш с вытеснением давно не использованных записей (LRU).
+
+В отличие от functools.lru_cache, кеш - отдельный объект: его можно передать нескольким
+обработчикам, сохранить на диск и загрузить в следующем запуске, а счетчики попаданий и промахов
+доступны через info().
+"""
+
+from collections import OrderedDict
+import pickle
+from classes.Manifest import atomic_open
+
+# Значение по умолчанию для get(), отличимое от любого сохраненного в кеше (в т.ч. None)
+MISSING = object()
+
+
+class LRUCache(object):
+
+    def __init__(self, maxsize=100000):
+        """maxsize - наибольшее число записей, None - без ограничения"""
+
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=MISSING):
+        """Возвращает значение по ключу, отмечая его как недавно использованное"""
+
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Сохраняет значение, вытесняя самую давнюю запись при переполнении"""
+
+        self.data[key] = value
+        self.data.move_to_end(key)
+
+        if self.maxsize is not None and len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """Счетчики кеша: попадания, промахи, текущий и наибольший размер"""
+
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.data), 'maxsize': self.maxsize}
+
+    def save(self, path):
+        """Атомарно сохраняет содержимое кеша (без счетчиков) на диск"""
+
+        with atomic_open(path, 'wb') as f:
+            pickle.dump(list(self.data.items()), f, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path, maxsize=100000):
+        """Создает кеш из сохраненного методом save() файла"""
+
+        cache = cls(maxsize)
+        with open(path, 'rb') as f:
+            for key, value in pickle.load(f):
+                cache.set(key, value)
+
+        return cache
@@ -0,0 +1,210 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Манифест обработанного корпуса для инкрементальной и возобновляемой предобработки.
+
+Для каждого исходного файла хранится размер, время изменения и хеш содержимого, а для всего
+манифеста - версия токенизатора/теггера. Файл считается актуальным, если его обработанная копия
+существует, версия совпадает, а размер и mtime (или, при изменившемся mtime, хеш) не поменялись.
+
+Манифест состоит из двух файлов в целевом каталоге:
+manifest.json - полный снимок, перезаписывается атомарно;
+manifest.log - журнал, в который дописывается по строке на каждый обработанный файл. Если прогон
+упал, журнал позволяет продолжить с того места, где обработка остановилась.
+
+Здесь же - общие средства безопасной записи: atomic_open для отдельного файла и версии каталогов
+(new_version/publish_version) для данных из нескольких файлов, которые должны меняться разом.
+"""
+
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+MANIFEST_NAME = 'manifest.json'
+JOURNAL_NAME = 'manifest.log'
+CURRENT_NAME = 'CURRENT'
+
+
+def file_hash(path, blocksize=1 << 20):
+    """Возвращает sha1 содержимого файла, читая его блоками"""
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+@contextmanager
+def atomic_open(path, mode='wb', **kwargs):
+    """
+    Открывает временный файл рядом с path и после успешной записи переименовывает его в path.
+
+    Переименование в пределах одного каталога атомарно, поэтому по пути path никогда не окажется
+    наполовину записанный файл. При ошибке временный файл удаляется.
+    """
+
+    parent = os.path.dirname(path) or '.'
+    fd, tmp = tempfile.mkstemp(dir=parent, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        # mkstemp создает файл с правами 0600, а результат должен быть доступен как обычный файл
+        os.chmod(tmp, 0o644)
+        with open(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def version_name(version):
+    return 'v{:05d}'.format(version)
+
+
+def list_versions(root):
+    """Возвращает имена каталогов версий в root по возрастанию"""
+
+    if not os.path.isdir(root):
+        return []
+
+    return sorted(name for name in os.listdir(root) if name.startswith('v') and name[1:].isdigit())
+
+
+def current_version(root):
+    """Возвращает имя каталога текущей версии в root или None, если ни одна версия еще не опубликована"""
+
+    path = os.path.join(root, CURRENT_NAME)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def new_version(root):
+    """
+    Создает в root каталог следующей версии и возвращает его имя.
+
+    Пока версия не опубликована (publish_version), читатели ее не видят, поэтому файлы в ней
+    можно писать как угодно долго и по одному.
+    """
+
+    if not os.path.exists(root):
+        os.makedirs(root)
+
+    versions = list_versions(root)
+    version = version_name(int(versions[-1][1:]) + 1 if versions else 1)
+    os.makedirs(os.path.join(root, version))
+
+    return version
+
+
+def publish_version(root, version, keep=2):
+    """
+    Делает версию текущей одной атомарной заменой файла CURRENT и удаляет старые версии.
+
+    Хранятся keep последних версий до опубликованной включительно: процессы, открывшие предыдущую
+    версию, могут дочитать ее. Более новые каталоги (их, возможно, сейчас пишет другой процесс) не трогаются.
+    """
+
+    with atomic_open(os.path.join(root, CURRENT_NAME), 'w', encoding='utf-8') as f:
+        f.write(version)
+
+    older = [name for name in list_versions(root) if name <= version]
+    for old in older[:max(0, len(older) - keep)]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+
+def stamp(path):
+    """Снимает отпечаток исходного файла: размер, mtime в наносекундах и хеш содержимого"""
+
+    stat = os.stat(path)
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'hash': file_hash(path),
+    }
+
+
+class Manifest(object):
+
+    """Манифест исходных файлов, уже обработанных препроцессором"""
+
+    def __init__(self, root, version):
+        self.root = root
+        self.version = version
+        self.path = os.path.join(root, MANIFEST_NAME)
+        self.journal = os.path.join(root, JOURNAL_NAME)
+
+        # fileid -> отпечаток исходного файла
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        """Загружает снимок манифеста и дописанный после него журнал"""
+
+        self.entries = {}
+
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Другая версия токенизатора - все файлы нужно обработать заново
+            if data.get('version') == self.version:
+                self.entries = data['files']
+
+        if os.path.exists(self.journal):
+            with open(self.journal, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Последняя строка могла не дописаться при падении
+                        continue
+                    if record.pop('version', None) == self.version:
+                        self.entries[record.pop('fileid')] = record
+
+    def save(self):
+        """Атомарно записывает полный снимок манифеста и очищает журнал"""
+
+        with atomic_open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.version, 'files': self.entries}, f, ensure_ascii=False)
+
+        if os.path.exists(self.journal):
+            os.remove(self.journal)
+
+    def is_fresh(self, fileid, source, target):
+        """Проверяет, что target получен из текущего содержимого source текущей версией обработки"""
+
+        entry = self.entries.get(fileid)
+        if entry is None or not os.path.exists(target):
+            return False
+
+        stat = os.stat(source)
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns == entry['mtime']:
+            return True
+
+        # mtime поменялся (например, файл скопирован заново), но содержимое могло остаться прежним
+        if file_hash(source) != entry['hash']:
+            return False
+
+        entry['mtime'] = stat.st_mtime_ns
+        return True
+
+    def record(self, fileid, entry):
+        """Запоминает отпечаток обработанного файла и сразу дописывает его в журнал"""
+
+        self.entries[fileid] = entry
+
+        line = dict(entry, fileid=fileid, version=self.version)
+        with open(self.journal, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(line, ensure_ascii=False) + '\n')
@@ -0,0 +1,130 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Словарь лексем, который можно отображать в память и разделять между процессами.
+
+Dictionary из Gensim при загрузке распаковывается целиком, и каждый обслуживающий процесс держит свою
+копию словаря. Здесь словарь хранится в плоских массивах, открываемых через numpy.memmap: все процессы
+читают одни и те же страницы из страничного кеша ОС.
+
+tokens.bin - лексемы в кодировке utf-8 подряд, упорядоченные по возрастанию (uint8);
+offsets.bin - смещения начала каждой лексемы в tokens.bin (int64, плюс завершающее);
+ids.bin - идентификатор каждой лексемы в словаре Dictionary (int32);
+meta.json - размер словаря и число документов, по которым он построен.
+
+Поиск лексемы - двоичный поиск по упорядоченным лексемам. Словарь пишется методом write в еще не
+опубликованный каталог версии (см. Manifest.new_version), поэтому читатели никогда не видят его
+наполовину записанным: GensimVectorizer кладет его в ту же версию, что и Dictionary, и публикует их вместе.
+"""
+
+import json
+import os
+import numpy as np
+from classes.LRUCache import LRUCache, MISSING
+from classes.Manifest import atomic_open
+
+META_NAME = 'meta.json'
+
+# Имя массива -> тип numpy
+ARRAYS = {
+    'tokens': np.uint8,
+    'offsets': np.int64,
+    'ids': np.int32,
+}
+
+
+class MappedVocabulary(object):
+
+    def __init__(self, path, cache_size=100000):
+        """
+        Открывает словарь, записанный методом write в каталог path.
+
+        Найденные идентификаторы запоминаются в кеше на cache_size лексем.
+        """
+
+        self.path = path
+        if not os.path.exists(os.path.join(path, META_NAME)):
+            raise ValueError("В каталоге {} нет записанного словаря".format(path))
+
+        with open(os.path.join(path, META_NAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        self.size = meta['size']
+        self.num_docs = meta['num_docs']
+        self.arrays = {name: self.load(name, dtype) for name, dtype in ARRAYS.items()}
+        self.cache = LRUCache(cache_size)
+
+    def load(self, name, dtype):
+        path = os.path.join(self.path, name + '.bin')
+        # numpy не умеет отображать в память пустой файл
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, token):
+        return self.lookup(token) is not None
+
+    def lookup(self, token):
+        """Возвращает идентификатор лексемы или None, если ее нет в словаре"""
+
+        token_id = self.cache.get(token)
+        if token_id is not MISSING:
+            return token_id
+
+        key = token.encode('utf-8')
+        tokens, offsets = self.arrays['tokens'], self.arrays['offsets']
+        lo, hi = 0, len(offsets) - 1
+        token_id = None
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = tokens[offsets[mid]:offsets[mid + 1]].tobytes()
+            if value < key:
+                lo = mid + 1
+            elif value > key:
+                hi = mid
+            else:
+                token_id = int(self.arrays['ids'][mid])
+                break
+
+        self.cache.set(token, token_id)
+        return token_id
+
+    def doc2bow(self, document):
+        """Как Dictionary.doc2bow: список пар (id, частота), упорядоченный по id, без неизвестных лексем"""
+
+        counts = {}
+        for token in document:
+            token_id = self.lookup(token)
+            if token_id is not None:
+                counts[token_id] = counts.get(token_id, 0) + 1
+
+        return sorted(counts.items())
+
+    @classmethod
+    def write(cls, id2word, path):
+        """Записывает словарь Dictionary в каталог path (meta.json пишется последним)"""
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        tokens = sorted(id2word.token2id)
+        encoded = [token.encode('utf-8') for token in tokens]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+
+        arrays = {
+            'tokens': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            'offsets': offsets,
+            'ids': np.array([id2word.token2id[token] for token in tokens], dtype=np.int32),
+        }
+        for name, values in arrays.items():
+            with atomic_open(os.path.join(path, name + '.bin'), 'wb') as f:
+                values.tofile(f)
+
+        with atomic_open(os.path.join(path, META_NAME), 'w', encoding='utf-8') as f:
+            json.dump({'size': len(id2word), 'num_docs': id2word.num_docs}, f)
@@ -0,0 +1,113 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Вспомогательные функции для распараллеливания обработки корпуса по процессам.
+
+Функция-обработчик передается в каждый процесс пула один раз (через initializer), а не с каждой
+порцией заданий - иначе вместе со связанным методом каждый раз сериализовался бы весь объект
+(например, объект чтения корпуса со списком всех файлов).
+
+Входные данные читаются с ограниченным опережением: в работе одновременно не больше
+prefetch порций на процесс. Pool.imap же вычитывает весь входной генератор сразу, и при
+потоковом чтении корпуса (например, PickledCorpusReader.docs()) весь корпус оказался бы в памяти.
+"""
+
+from itertools import islice
+import os
+import queue
+from multiprocessing import Pool
+
+# Обработчик, установленный в текущем процессе пула
+_worker_func = None
+
+
+def _init_worker(func):
+    global _worker_func
+    _worker_func = func
+
+
+def _call_chunk(index, chunk):
+    """Обрабатывает порцию в процессе пула, возвращая (номер порции, результаты, ошибка)"""
+
+    try:
+        return index, [_worker_func(item) for item in chunk], None
+    except Exception as e:
+        return index, None, e
+
+
+def effective_jobs(n_jobs):
+    """
+    Переводит n_jobs в число процессов.
+
+    None, 0 и 1 - работа в текущем процессе без пула. Отрицательные значения отсчитываются от
+    числа ядер, как в Scikit-Learn: -1 - все ядра, -2 - все, кроме одного, и т.д.
+    """
+
+    if not n_jobs:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return n_jobs
+
+
+def imap(func, items, n_jobs=None, chunksize=1, ordered=True, prefetch=2):
+    """
+    Генератор, применяющий func к каждому элементу items.
+
+    При n_jobs > 1 работа распределяется по пулу процессов порциями по chunksize элементов,
+    при этом из items вычитывается не больше prefetch порций на процесс вперед.
+    ordered=True возвращает результаты в порядке items, ordered=False - по мере готовности.
+    """
+
+    jobs = effective_jobs(n_jobs)
+
+    # Без пула - обычный последовательный проход
+    if jobs == 1:
+        for item in items:
+            yield func(item)
+        return
+
+    items = iter(items)
+    window = jobs * prefetch
+    done = queue.Queue()
+
+    def failed(error):
+        # Ошибки вне обработчика (например, не удалось передать результат из процесса)
+        done.put((None, None, error))
+
+    with Pool(jobs, initializer=_init_worker, initargs=(func,)) as pool:
+        submitted = 0  # отправлено порций
+        received = 0  # получено порций
+        emitted = 0  # порций, результаты которых уже отданы (для ordered)
+        buffered = {}  # готовые порции, ожидающие своей очереди (для ordered)
+        exhausted = False
+
+        while True:
+            # Держим в работе не больше window порций, считая ждущие очереди в buffered
+            while not exhausted and submitted - (emitted if ordered else received) < window:
+                chunk = list(islice(items, chunksize))
+                if not chunk:
+                    exhausted = True
+                    break
+                pool.apply_async(_call_chunk, (submitted, chunk), callback=done.put, error_callback=failed)
+                submitted += 1
+
+            if received == submitted:
+                return
+
+            index, results, error = done.get()
+            received += 1
+            if error is not None:
+                raise error
+
+            if not ordered:
+                for result in results:
+                    yield result
+                continue
+
+            buffered[index] = results
+            while emitted in buffered:
+                for result in buffered.pop(emitted):
+                    yield result
+                emitted += 1
@@ -0,0 +1,139 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Покадровый формат .pickle-файлов обработанного корпуса и индекс к нему.
+
+Раньше документ сохранялся одним pickle-объектом, и чтобы добраться до абзаца 500, нужно было
+распаковать весь документ. Теперь файл - это последовательность pickle-кадров: сначала заголовок
+(словарь с форматом), затем по кадру на каждый абзац. Рядом с файлом лежит индекс .idx (JSON)
+со смещениями кадров и числом предложений и лексем в каждом абзаце. По индексу можно прочитать
+отдельный абзац или предложение через seek и получить размеры документа, не читая его.
+
+Документ завершается кадром FOOTER (с версии 2 формата): если файл обрезан, чтение документа
+заканчивается ошибкой, а не возвращает часть абзацев как целый документ. Файлы версии 1 (без FOOTER)
+и старые файлы (документ одним объектом) читаются как раньше: первый объект старых файлов - список, а не заголовок.
+Индекс хранит размер и mtime файла; если файл перезаписан, а индекс еще нет, индекс игнорируется.
+"""
+
+import json
+import os
+import pickle
+from classes.Manifest import atomic_open
+
+INDEX_EXT = '.idx'
+HEADER = {'format': 'paragraphs', 'version': 2}
+FOOTER = {'format': 'paragraphs', 'end': True}
+# Заголовки версий формата, которые умеет читать iter_document
+HEADERS = (HEADER, {'format': 'paragraphs', 'version': 1})
+
+
+def index_path(path):
+    """Путь к индексу рядом с .pickle-файлом"""
+
+    return os.path.splitext(path)[0] + INDEX_EXT
+
+
+class FrameWriter(object):
+
+    """Пишет абзацы документа отдельными кадрами в открытый файл и собирает индекс"""
+
+    def __init__(self, f):
+        self.f = f
+        pickle.dump(HEADER, f, pickle.HIGHEST_PROTOCOL)
+
+        self.offsets = []
+        self.sents = []
+        self.words = []
+
+    def write(self, para):
+        self.offsets.append(self.f.tell())
+        pickle.dump(para, self.f, pickle.HIGHEST_PROTOCOL)
+
+        self.sents.append(len(para))
+        self.words.append(sum(len(sent) for sent in para))
+
+    def index(self):
+        return {
+            'offsets': self.offsets + [self.f.tell()],
+            'sents': self.sents,
+            'words': self.words,
+        }
+
+    def close(self):
+        """Дописывает завершающий кадр и возвращает индекс документа"""
+
+        index = self.index()
+        pickle.dump(FOOTER, self.f, pickle.HIGHEST_PROTOCOL)
+        return index
+
+
+def write_index(path, index):
+    """Атомарно записывает индекс уже записанного файла path, запоминая его размер и mtime"""
+
+    stat = os.stat(path)
+    index = dict(index, size=stat.st_size, mtime=stat.st_mtime_ns)
+
+    with atomic_open(index_path(path), 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+
+
+def read_index(path):
+    """Возвращает индекс файла path или None, если индекса нет или он не соответствует файлу"""
+
+    try:
+        with open(index_path(path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    if index['size'] != stat.st_size or index['mtime'] != stat.st_mtime_ns:
+        return None
+
+    return index
+
+
+def iter_document(f, end=None):
+    """
+    Генератор абзацев документа из открытого файла любого формата, по одному кадру за раз.
+
+    В памяти держится только текущий абзац (кроме старого формата, где документ - один объект).
+    end - смещение конца документа в файле, если за ним идут другие документы (как в шардах).
+    Если документ обрывается раньше завершающего кадра (или раньше end), вызывает ValueError.
+    """
+
+    first = pickle.load(f)
+    if first not in HEADERS:
+        yield from first
+        return
+
+    while end is None or f.tell() < end:
+        try:
+            frame = pickle.load(f)
+        except (EOFError, pickle.UnpicklingError) as e:
+            # У версии 1 нет завершающего кадра: конец файла - конец документа, если он не обрезан внутри кадра
+            if first != HEADER and end is None and isinstance(e, EOFError):
+                return
+            raise ValueError("Документ обрезан: файл закончился на смещении {}".format(f.tell()))
+
+        if frame == FOOTER:
+            return
+        yield frame
+
+    if first == HEADER:
+        raise ValueError("Документ обрезан: нет завершающего кадра до смещения {}".format(end))
+
+
+def stream_document(path, offset=0, length=None):
+    """Генератор абзацев документа из файла path; файл открывается при первом обращении и закрывается в конце"""
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        yield from iter_document(f, None if length is None else offset + length)
+
+
+def read_document(f):
+    """Читает документ целиком из открытого файла любого формата - покадрового или старого"""
+
+    return list(iter_document(f))
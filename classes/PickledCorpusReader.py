@@ -2,8 +2,12 @@
 # -*- coding: utf-8 -*-
 
 import pickle
-from nltk.corpus.reader.api import (CorpusReader, CategorizedCorpusReader)
-from classes.CustomCorpusReader import HTMLCorpusReader, CAT_PATTERN
+from bisect import bisect_right
+from itertools import accumulate
+from classes.CustomCorpusReader import HTMLCorpusReader
+from classes.Instrumentation import instrumented, text_bytes
+from classes.PickleFrames import read_document, read_index, stream_document
+from classes.ShardStore import read_shard_documents, read_shard_index, shard_root, stream_shard_documents
 
 PKL_PATTERN = r'(?!\.)[\w_\s]+/[\w\s\d\-]+\.pickle'
 
@@ -12,29 +16,146 @@ class PickledCorpusReader(HTMLCorpusReader):
 
     """Класс наследует HTMLCorpusReader, но работает не с исходным корпусом, а с обработанным препроцессором"""
 
-    def __init__(self, root, fileids=PKL_PATTERN, **kwargs):
-        if not any(key.startswith('cat_') for key in kwargs.keys()):
-            kwargs['cat_pattern'] = CAT_PATTERN
-        CategorizedCorpusReader.__init__(self, kwargs)
-        CorpusReader.__init__(self, root, fileids)
+    def __init__(self, root, fileids=PKL_PATTERN, shards=False, index=False, **kwargs):
+        """
+        shards=True - корпус упакован в шарды (см. ShardStore): файлы и категории берутся из индекса
+        шардов без обхода каталога, а документы читаются из шардов по смещению.
+        index - брать файлы и категории из сохраненного индекса корпуса (см. CorpusIndex), как у HTMLCorpusReader.
+        """
 
-    def docs(self, fileids=None, categories=None):
-        """Переопределенный docs из HTMLCorpusReader - загружает документы из архивов"""
+        self.shards = None
+        self.shard_path = None
+
+        if shards:
+            # Каталог версии запоминается, чтобы индекс и шарды читались из одной записи хранилища
+            self.shard_path = shard_root(root)
+            entries = read_shard_index(self.shard_path)
+            self.shards = {entry[0]: entry for entry in entries}
+            self.init_from_index(root, [entry[0] for entry in entries], [entry[1] for entry in entries])
+            return
+
+        self.init_corpus(root, fileids, 'utf8', index, kwargs)
+
+    @instrumented('docs')
+    def docs(self, fileids=None, categories=None, stream=False):
+        """
+        Переопределенный docs из HTMLCorpusReader - загружает документы из архивов
+
+        stream=True - вместо списка абзацев каждый документ возвращается генератором абзацев,
+        читаемых с диска по одному кадру: память зависит от размера абзаца, а не документа.
+        """
 
         fileids = self.resolve(fileids, categories)
 
+        if self.shards is not None:
+            fileids = fileids or self.fileids()
+            if isinstance(fileids, str):
+                fileids = [fileids]
+            entries = [self.shards[fileid] for fileid in fileids]
+            if stream:
+                yield from stream_shard_documents(self.shard_path, entries)
+            else:
+                yield from read_shard_documents(self.shard_path, entries)
+            return
+
         # Загружаем документы в память по одному
         for path in self.abspaths(fileids):
+            if stream:
+                yield stream_document(path)
+                continue
+
             with open(path, 'rb') as f:
-                yield pickle.load(f)
+                yield read_document(f)
+
+    def index(self, fileid):
+        """
+        Возвращает индекс документа: смещения абзацев в файле, число предложений и лексем в каждом абзаце.
+
+        Для документов без актуального индекса (например, записанных старой версией препроцессора
+        или упакованных в шарды) возвращает None.
+        """
+
+        if self.shards is not None:
+            return None
+
+        return read_index(self.abspath(fileid))
+
+    def counts(self, fileids=None, categories=None):
+        """
+        Возвращает число документов, абзацев, предложений и лексем.
+
+        Для проиндексированных документов содержимое не читается, остальные загружаются целиком.
+        """
+
+        fileids = self.resolve(fileids, categories) or self.fileids()
+        if isinstance(fileids, str):
+            fileids = [fileids]
 
+        counts = {'docs': len(fileids), 'paras': 0, 'sents': 0, 'words': 0}
+        for fileid in fileids:
+            index = self.index(fileid)
+            if index is not None:
+                sents, words = index['sents'], index['words']
+            else:
+                doc = next(self.docs(fileid))
+                sents = [len(para) for para in doc]
+                words = [len(sent) for para in doc for sent in para]
+
+            counts['paras'] += len(sents)
+            counts['sents'] += sum(sents)
+            counts['words'] += sum(words)
+
+        return counts
+
+    def para(self, fileid, i):
+        """Возвращает абзац i документа, читая с диска только его (если у документа есть индекс)"""
+
+        index = self.index(fileid)
+        if index is None:
+            return next(self.docs(fileid))[i]
+
+        offsets = index['offsets']
+        if i < 0:
+            i += len(offsets) - 1
+        if not 0 <= i < len(offsets) - 1:
+            raise IndexError("В документе {} нет абзаца {}".format(fileid, i))
+
+        with open(self.abspath(fileid), 'rb') as f:
+            f.seek(offsets[i])
+            return pickle.load(f)
+
+    def sent(self, fileid, i):
+        """Возвращает предложение i документа (сквозная нумерация по всем абзацам)"""
+
+        index = self.index(fileid)
+        if index is None:
+            return list(self.sents(fileid))[i]
+
+        # Номер абзаца находим двоичным поиском по накопленному числу предложений
+        bounds = list(accumulate(index['sents']))
+        if i < 0:
+            i += bounds[-1] if bounds else 0
+        if not 0 <= i < (bounds[-1] if bounds else 0):
+            raise IndexError("В документе {} нет предложения {}".format(fileid, i))
+
+        para = bisect_right(bounds, i)
+        start = bounds[para - 1] if para else 0
+
+        return self.para(fileid, para)[i - start]
+
+    @instrumented('paras')
     def paras(self, fileids=None, categories=None):
-        """Переопределяем paras, потому что документ, прошедший обработку, хранится как список абзацев"""
+        """
+        Переопределяем paras, потому что документ, прошедший обработку, хранится как список абзацев
+
+        Абзацы читаются по одному кадру (docs с stream=True), документ целиком в память не загружается.
+        """
 
-        for doc in self.docs(fileids, categories):
+        for doc in self.docs(fileids, categories, stream=True):
             for para in doc:
                 yield para
 
+    @instrumented('sents')
     def sents(self, fileids=None, categories=None):
         """Переопределяем sents, т.к. каждый абзац теперь - список предложений"""
 
@@ -42,6 +163,7 @@ class PickledCorpusReader(HTMLCorpusReader):
             for sent in para:
                 yield sent
 
+    @instrumented('tagged')
     def tagged(self, fileids=None, categories=None):
         """Т.к. предложение у нас список кортежей лексем и тегов, то возвращает лексемы с тегами"""
 
@@ -49,6 +171,7 @@ class PickledCorpusReader(HTMLCorpusReader):
             for tagged_token in sent:
                 yield tagged_token
 
+    @instrumented('words', text_bytes)
     def words(self, fileids=None, categories=None):
         """Переопределяем words, т.к. предложение у нас теперт - это список кортежей лексем и тегов"""
 
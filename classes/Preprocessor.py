@@ -1,19 +1,78 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from nltk import (pos_tag, sent_tokenize, wordpunct_tokenize)
+from functools import partial
+from itertools import islice
+import nltk
+from classes.ArrayCorpusReader import ArrayCorpusWriter
 from classes.CustomCorpusReader import HTMLCorpusReader
+from classes.Manifest import Manifest, atomic_open, stamp
+from classes.Parallel import imap
+from classes.PickleFrames import FrameWriter, write_index
+from classes.Schedule import file_sizes, find_outliers, order_by_size
+from classes.ShardStore import ShardWriter
 import os
-import pickle
+import time
+
+# Версия обработки, записываемая в манифест. Если меняется токенизация или теггер,
+# ранее обработанные файлы перестают считаться актуальными.
+TOKENIZER_VERSION = 'nltk-{}/sent_tokenize/wordpunct_tokenize/pos_tag-rus'.format(nltk.__version__)
+
+# Хранилища, в которые документы пишутся одним объектом записи из текущего процесса.
+# Для store='files' каждый документ пишется в свой .pickle методом process().
+STORES = {
+    'arrays': ArrayCorpusWriter,
+    'shards': ShardWriter,
+}
 
 
 class Preprocessor(object):
 
     """Обёртка над HTMLCorpusReader"""
 
-    def __init__(self, corpus, target, **kwargs):
+    # Замеры по этапам (см. Instrumentation), по умолчанию выключены
+    instrument = None
+
+    def __init__(self, corpus, target, n_jobs=None, chunksize=1, ordered=True, incremental=True, store='files',
+                 largest_first=False, split_size=None, segment_paras=100, outliers=10, **kwargs):
+        """
+        n_jobs - число процессов для transform (None или 1 - без пула, -1 - все ядра),
+        chunksize - сколько файлов отдавать процессу пула за раз,
+        ordered - возвращать результаты в порядке файлов (True) или по мере готовности (False),
+        incremental - пропускать файлы, которые по манифесту уже обработаны и не менялись,
+        store - формат результата: 'files' - .pickle на каждый документ, 'arrays' - массивы
+        ArrayCorpusReader, 'shards' - шарды ShardStore (в последних двух режимах корпус каждый раз
+        записывается целиком, без манифеста).
+
+        largest_first - отдавать файлы в пул от больших к меньшим (при ordered=True результаты все равно
+        возвращаются в порядке файлов), split_size - файлы больше split_size байт делятся на части: абзацы
+        извлекаются в текущем процессе последовательно, а параллельно, в том же пуле, что и остальные
+        файлы, идет только их разметка частями по segment_paras абзацев; части собираются обратно
+        по порядку (None - не делить),
+        outliers - сколько выбросов по размеру и времени включать в отчет прогона.
+        """
+
+        if store != 'files' and store not in STORES:
+            raise ValueError("Неизвестный формат хранилища: {}".format(store))
+
         self.corpus = corpus
         self.target = target
+        self.n_jobs = n_jobs
+        self.chunksize = chunksize
+        self.ordered = ordered
+        self.incremental = incremental
+        self.store = store
+        self.largest_first = largest_first
+        self.split_size = split_size
+        self.segment_paras = segment_paras
+        self.outliers = outliers
+
+        # Отчет последнего вызова transform (см. make_report)
+        self.report = None
+        # Ошибки последнего вызова transform: fileid -> описание ошибки
+        self.errors = {}
+        # Файлы, пропущенные последним вызовом transform как актуальные
+        self.skipped = []
 
     def fileids(self, fileids=None, categories=None):
         fileids = self.corpus.resolve(fileids, categories)
@@ -35,21 +94,37 @@ class Preprocessor(object):
         # Возвращаем путь к файлу относительно корня целевого корпуса
         return os.path.normpath(os.path.join(self.target, parent, basename))
 
+    def target_fileid(self, fileid):
+        """Идентификатор обработанного документа - путь к его .pickle относительно целевого корпуса"""
+
+        return os.path.relpath(self.abspath(fileid), self.target).replace(os.sep, '/')
+
     def tokenize(self, fileid):
-        for paragraph in self.corpus.paras(fileids=fileid):
-            yield[
-                pos_tag(wordpunct_tokenize(sent), lang='rus')
-                for sent in sent_tokenize(paragraph)
-            ]
+        """Размечает документ по абзацам теггером исходного корпуса (см. HTMLCorpusReader.tokenize)"""
+
+        return self.corpus.tokenize(fileids=fileid)
 
     def process(self, fileid):
         """
         Записывает трансформированный документ в виде сжатого архива в заданное место.
 
+        Каждый абзац пишется отдельным pickle-кадром сразу после разметки, поэтому память процесса зависит
+        от размера абзаца, а не документа. Рядом сохраняется индекс .idx, по которому
+        PickledCorpusReader читает отдельные абзацы и предложения, не распаковывая весь документ.
+
         Вызывается для одного файла, проверяет местоположение на диске, чтобы избежать ошибок.
         Использует tokenize() для предварительной обработки. Полученные данные и записываются в файл.
         """
 
+        target = self.prepare_target(fileid)
+        self.write(target, self.tokenize(fileid))
+
+        # Возвращаем путь к целевому файлу
+        return target
+
+    def prepare_target(self, fileid):
+        """Возвращает путь к файлу для записи результата, создавая его каталог"""
+
         # Определяем путь к файлу для записи результата
         target = self.abspath(fileid)
         parent = os.path.dirname(target)
@@ -62,26 +137,433 @@ class Preprocessor(object):
         if not os.path.isdir(parent):
             raise ValueError("Нужно предоставить папку для записи обработанных данных!")
 
-        # Создаем структуру данных для записи в архив
-        document = list(self.tokenize(fileid))
+        return target
 
-        # Пишем данные в архив на диск
-        with open(target, 'wb') as f:
-            pickle.dump(document, f, pickle.HIGHEST_PROTOCOL)
+    def write(self, target, paras):
+        """
+        Пишет абзацы кадрами во временный файл по мере их разметки, не собирая документ в памяти,
+        и переименовывает его, чтобы не оставить наполовину записанный архив. Индекс со смещениями
+        абзацев пишется следом.
+        """
 
-        # Удаляем документ из памяти
-        del document
+        with atomic_open(target, 'wb') as f:
+            writer = FrameWriter(f)
+            for para in paras:
+                writer.write(para)
+            index = writer.close()
+        write_index(target, index)
 
-        # Возвращаем путь к целевому файлу
-        return target
+    def tag_segment(self, paras):
+        """Размечает часть абзацев большого документа (выполняется в процессе пула)"""
+
+        return [self.corpus.tagger.tag_paragraph(para) for para in paras]
+
+    def safe_process(self, fileid):
+        """
+        Вызывает process() и перехватывает ошибку, чтобы один плохой файл не останавливал весь прогон.
+
+        Возвращает кортеж (fileid, путь к целевому файлу или None, описание ошибки или None,
+        отпечаток исходного файла для манифеста, время обработки в секундах). Отпечаток снимается
+        до обработки, чтобы изменение файла во время обработки не было принято за уже учтенное.
+        """
+
+        started = time.perf_counter()
+        try:
+            entry = stamp(self.corpus.abspath(fileid))
+            target = self.process(fileid)
+            return fileid, target, None, entry, time.perf_counter() - started
+        except Exception as e:
+            return fileid, None, "{}: {}".format(type(e).__name__, e), None, time.perf_counter() - started
+
+    def safe_tokenize(self, fileid):
+        """
+        Как safe_process(), но возвращает сам обработанный документ:
+        (fileid, документ или None, ошибка, время обработки в секундах)
+        """
+
+        started = time.perf_counter()
+        try:
+            return fileid, list(self.tokenize(fileid)), None, time.perf_counter() - started
+        except Exception as e:
+            return fileid, None, "{}: {}".format(type(e).__name__, e), time.perf_counter() - started
+
+    def segments(self, fileid):
+        """
+        Генератор частей большого документа для пула (выполняется в текущем процессе).
+
+        Абзацы читаются из генератора corpus.paras() по segment_paras за раз, документ целиком в память
+        не загружается. Извлечение абзацев (readability и bs4) разбирает документ целиком, поэтому
+        делится не оно, а только разметка: извлечение большого файла идет здесь, последовательно, и пока
+        оно идет, процессы пула заняты уже отданными заданиями (не больше prefetch порций на процесс). Каждая часть - кортеж (номер, абзацы или None, последняя ли часть, время
+        извлечения в секундах, отпечаток исходного файла или None, описание ошибки или None).
+        Отпечаток передается с первой частью и снимается до чтения файла (см. safe_process).
+        Ошибка извлечения завершает документ частью с описанием ошибки.
+        """
+
+        i = 0
+        started = time.perf_counter()
+        try:
+            entry = stamp(self.corpus.abspath(fileid))
+            paras = self.corpus.paras(fileids=fileid)
+            current = list(islice(paras, self.segment_paras))
+            secs = time.perf_counter() - started
+
+            # Читаем на одну часть вперед, чтобы отметить последнюю
+            while True:
+                started = time.perf_counter()
+                following = list(islice(paras, self.segment_paras))
+                following_secs = time.perf_counter() - started
+                last = not following
+
+                yield i, current, last, secs, entry, None
+                if last:
+                    return
+
+                i, current, secs, entry = i + 1, following, following_secs, None
+                started = time.perf_counter()
+        except Exception as e:
+            yield i, None, True, time.perf_counter() - started, None, "{}: {}".format(type(e).__name__, e)
+
+    def tasks(self, fileids, split):
+        """
+        Задания для пула: (fileid, None) - обработать файл целиком, (fileid, часть) - разметить
+        часть файла из split (см. segments).
+        """
+
+        for fileid in fileids:
+            if fileid not in split:
+                yield fileid, None
+                continue
+
+            for segment in self.segments(fileid):
+                yield fileid, segment
+
+    def run_task(self, func, task):
+        """
+        Выполняет задание из tasks() в процессе пула.
+
+        Файл целиком обрабатывается func (safe_process или safe_tokenize), ее результат возвращается как
+        (fileid, None, результат). Для части возвращается (fileid, размеченная часть, None) - кортеж как
+        в segments(), но с размеченными абзацами и временем извлечения вместе с разметкой.
+        """
+
+        fileid, segment = task
+        if segment is None:
+            return fileid, None, func(fileid)
+
+        i, paras, last, secs, entry, error = segment
+        started = time.perf_counter()
+        tagged = None
+        if error is None:
+            try:
+                tagged = self.tag_segment(paras)
+            except Exception as e:
+                error = "{}: {}".format(type(e).__name__, e)
+
+        return fileid, (i, tagged, last, secs + time.perf_counter() - started, entry, error), None
+
+    def stitch(self, results, write):
+        """
+        Собирает результаты run_task() в результаты по файлам.
+
+        Результаты файлов, обработанных целиком, возвращаются как есть. Части больших файлов при
+        ordered=False могут прийти не по порядку, поэтому готовые части держатся в ready по ключу
+        (fileid, номер) и разбираются строго по номерам. При write=True части пишутся в целевой файл
+        (как в write()), и для файла возвращается кортеж как у safe_process(), иначе документ собирается
+        в памяти и возвращается кортеж как у safe_tokenize(). Время большого файла - сумма времени его частей.
+        """
+
+        ready = {}
+        # fileid -> номер следующей части, время, отпечаток, ошибка, документ или открытый целевой файл
+        files = {}
+
+        try:
+            for fileid, segment, result in results:
+                if segment is None:
+                    yield result
+                    continue
+
+                i, paras, last, secs, entry, error = segment
+                ready[fileid, i] = paras, last, secs, entry, error
+                state = files.setdefault(fileid, {'next': 0, 'secs': 0.0, 'entry': None, 'error': None,
+                                                  'document': [], 'target': None, 'sink': None, 'writer': None})
+
+                while (fileid, state['next']) in ready:
+                    paras, last, secs, entry, error = ready.pop((fileid, state['next']))
+                    state['next'] += 1
+                    state['secs'] += secs
+                    state['entry'] = state['entry'] or entry
+                    state['error'] = state['error'] or error
+
+                    if state['error'] is None:
+                        try:
+                            self.append_segment(fileid, state, paras, write)
+                        except Exception as e:
+                            state['error'] = "{}: {}".format(type(e).__name__, e)
+
+                    if last:
+                        del files[fileid]
+                        yield self.finish(fileid, state, write)
+        finally:
+            # Недописанные файлы (прогон прерван) не должны остаться на диске
+            for state in files.values():
+                self.discard(state)
+
+    def append_segment(self, fileid, state, paras, write):
+        """Добавляет размеченную часть к документу или дописывает ее в целевой файл (см. stitch)"""
+
+        if not write:
+            state['document'].extend(paras)
+            return
+
+        if state['sink'] is None:
+            state['target'] = self.prepare_target(fileid)
+            state['sink'] = atomic_open(state['target'], 'wb')
+            state['writer'] = FrameWriter(state['sink'].__enter__())
+
+        for para in paras:
+            state['writer'].write(para)
+
+    def finish(self, fileid, state, write):
+        """Завершает файл, собранный из частей, и возвращает его результат (см. stitch)"""
+
+        if not write:
+            error = state['error']
+            return fileid, state['document'] if error is None else None, error, state['secs']
+
+        if state['error'] is None:
+            try:
+                index = state['writer'].close()
+                sink, state['sink'] = state['sink'], None
+                sink.__exit__(None, None, None)
+                write_index(state['target'], index)
+                return fileid, state['target'], None, state['entry'], state['secs']
+            except Exception as e:
+                state['error'] = "{}: {}".format(type(e).__name__, e)
+
+        self.discard(state)
+        return fileid, None, state['error'], None, state['secs']
+
+    def discard(self, state):
+        """Удаляет временный файл недописанного документа"""
+
+        sink, state['sink'] = state['sink'], None
+        if sink is not None:
+            # atomic_open удаляет временный файл, если запись завершилась ошибкой
+            error = RuntimeError("Запись {} прервана".format(state['target']))
+            sink.__exit__(RuntimeError, error, None)
+
+    def measure(self, fileid, secs, size=0):
+        """
+        Учитывает время обработки документа в замерах, если они включены.
+
+        Этап process - полное время документа, включая этапы чтения, которые в него вложены.
+        """
+
+        if self.instrument is not None:
+            self.instrument.add('process', secs, 1, size)
+            self.instrument.document(fileid, secs, 'process')
+
+    def schedule(self, fileids):
+        """
+        Возвращает файлы в порядке обработки, их размеры и множество файлов, которые нужно делить на части.
+
+        Размеры берутся из HTMLCorpusReader.sizes().
+        """
+
+        sizes = file_sizes(self.corpus, fileids)
+        if self.largest_first:
+            fileids = order_by_size(fileids, sizes)
+
+        split = set()
+        if self.split_size is not None:
+            split = {fileid for fileid in fileids if sizes[fileid] > self.split_size}
+
+        return fileids, sizes, split
+
+    def run(self, func, fileids, split):
+        """
+        Применяет func (safe_process или safe_tokenize) к файлам и возвращает ее результаты.
+
+        Все файлы идут через один пул: файлы из split отдаются в него частями (см. tasks) вперемешку
+        с остальными файлами, а части собираются обратно в текущем процессе (см. stitch).
+        """
+
+        results = imap(partial(self.run_task, func), self.tasks(fileids, split),
+                       self.n_jobs, self.chunksize, self.ordered)
+
+        return self.stitch(results, write=func == self.safe_process)
+
+    def make_report(self, rows, split, started):
+        """
+        Отчет прогона: число и общий размер обработанных файлов, время, разделенные на части файлы
+        и выбросы - файлы, заметно превосходящие типичный по размеру или времени обработки.
+        """
+
+        return {
+            'files': len(rows),
+            'bytes': sum(row['size'] for row in rows),
+            'secs': time.perf_counter() - started,
+            'errors': len(self.errors),
+            'split': sorted(split),
+            'outliers': find_outliers(rows, self.outliers),
+        }
+
+    def transform_store(self, fileids):
+        """
+        Обрабатывает файлы и пишет их в хранилище self.store, возвращая идентификаторы обработанных документов.
+
+        Разбор и маркировка идут в пуле процессов, а запись - в текущем процессе, т.к. хранилище
+        общее на весь корпус (словарь лексем, индекс документов). Документы пишутся в хранилище
+        в порядке обработки, а при ordered=True идентификаторы возвращаются в порядке fileids.
+        """
+
+        started = time.perf_counter()
+        pending, sizes, split = self.schedule(fileids)
+        rows = []
+
+        writer = STORES[self.store](self.target)
+        try:
+            stored = self.store_documents(self.run(self.safe_tokenize, pending, split), writer, rows, sizes, split)
+            if self.ordered:
+                yield from self.in_order(fileids, stored)
+            else:
+                for fileid, target in stored:
+                    if target is not None:
+                        yield target
+        finally:
+            # Даже при прерывании остается корректное хранилище из уже обработанных документов
+            writer.close()
+            self.report = self.make_report(rows, split, started)
+
+    def store_documents(self, results, writer, rows, sizes, split):
+        """
+        Как record(), но для результатов safe_tokenize(): документы добавляются в хранилище writer.
+
+        Возвращает пары (fileid, идентификатор документа в хранилище или None при ошибке).
+        """
+
+        for fileid, document, error, secs in results:
+            self.measure(fileid, secs, sizes[fileid])
+            rows.append({'fileid': fileid, 'size': sizes[fileid], 'secs': secs, 'split': fileid in split})
+            if error is not None:
+                self.errors[fileid] = error
+                print("Невозможно обработать {}: {}".format(fileid, error))
+                yield fileid, None
+                continue
+
+            target = self.target_fileid(fileid)
+            writer.add(target, document)
+            yield fileid, target
 
     def transform(self, fileids=None, categories=None):
-        """Метод, вызывающий process()"""
+        """
+        Метод, вызывающий process() для каждого файла и возвращающий пути к целевым файлам.
+
+        При n_jobs > 1 файлы обрабатываются пулом процессов. Ошибки не прерывают прогон: они
+        выводятся и сохраняются в self.errors, а путь для такого файла не возвращается.
+
+        При store, отличном от 'files', вместо путей возвращаются идентификаторы документов в хранилище.
+
+        При largest_first файлы отдаются в пул от больших к меньшим, файлы больше split_size - частями.
+        После прогона в self.report сохраняется отчет (см. make_report).
+
+        Файлы, не изменившиеся с прошлого прогона (по манифесту в целевом каталоге), не обрабатываются
+        повторно, но их пути тоже возвращаются: при ordered=True - в порядке fileids вместе с остальными,
+        при ordered=False - сразу. Каждый обработанный файл сразу отмечается в журнале
+        манифеста, поэтому прерванный прогон продолжится с места остановки.
+        """
 
         # Создаем целевой каталог, если он еще не создан
         if not os.path.exists(self.target):
             os.makedirs(self.target)
 
+        self.errors = {}
+        self.skipped = []
+        self.report = None
+
         # Получить имена файлов для обработки
-        for fileid in self.fileids(fileids, categories):
-            yield self.process(fileid)
+        fileids = self.fileids(fileids, categories)
+        if isinstance(fileids, str):
+            fileids = [fileids]
+        # Повторы обрабатываются один раз (иначе in_order ждал бы второго результата для того же файла)
+        fileids = list(dict.fromkeys(fileids))
+
+        if self.store != 'files':
+            yield from self.transform_store(fileids)
+            return
+
+        manifest = Manifest(self.target, TOKENIZER_VERSION)
+
+        # Отбираем файлы, которые нужно обработать
+        fresh = set()
+        pending = []
+        for fileid in fileids:
+            if self.incremental and manifest.is_fresh(fileid, self.corpus.abspath(fileid), self.abspath(fileid)):
+                self.skipped.append(fileid)
+                fresh.add(fileid)
+            else:
+                pending.append(fileid)
+
+        started = time.perf_counter()
+        pending, sizes, split = self.schedule(pending)
+        rows = []
+
+        try:
+            processed = self.record(self.run(self.safe_process, pending, split), manifest, rows, sizes, split)
+            if self.ordered:
+                yield from self.in_order(fileids, processed, fresh)
+            else:
+                # Уже обработанные файлы возвращаем сразу, остальные - по мере готовности
+                for fileid in self.skipped:
+                    yield self.abspath(fileid)
+                for fileid, target in processed:
+                    if target is not None:
+                        yield target
+        finally:
+            manifest.save()
+            self.report = self.make_report(rows, split, started)
+
+    def record(self, results, manifest, rows, sizes, split):
+        """
+        Учитывает результаты safe_process(): замеры, строки отчета, ошибки и записи манифеста.
+
+        Возвращает пары (fileid, путь к целевому файлу или None при ошибке) в порядке results.
+        """
+
+        for fileid, target, error, entry, secs in results:
+            self.measure(fileid, secs, sizes[fileid])
+            rows.append({'fileid': fileid, 'size': sizes[fileid], 'secs': secs, 'split': fileid in split})
+            if error is not None:
+                self.errors[fileid] = error
+                print("Невозможно обработать {}: {}".format(fileid, error))
+                yield fileid, None
+                continue
+
+            manifest.record(fileid, entry)
+            yield fileid, target
+
+    def in_order(self, fileids, processed, fresh=()):
+        """
+        Возвращает пути к целевым файлам в порядке fileids.
+
+        processed - пары (fileid, путь или None при ошибке) в порядке обработки: результаты, опередившие
+        свою очередь, держатся в памяти до нее (только пути, не документы). Для актуальных файлов из fresh
+        пути возвращаются без обработки.
+        """
+
+        processed = iter(processed)
+        ready = {}
+
+        for fileid in fileids:
+            if fileid in fresh:
+                yield self.abspath(fileid)
+                continue
+
+            while fileid not in ready:
+                done, target = next(processed)
+                ready[done] = target
+
+            target = ready.pop(fileid)
+            if target is not None:
+                yield target
@@ -0,0 +1,86 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Ленивая проверка ресурсов NLTK (моделей теггера, стоп-слов, WordNet и т.п.).
+
+Ресурс проверяется один раз за процесс, при первом обращении к нему, а не при импорте модуля.
+Если ресурс не установлен, он скачивается через nltk.download, а в офлайн-режиме
+(config.NLTK_OFFLINE, переменная окружения TEXTANALYSIS_OFFLINE=1) сразу выбрасывается LookupError
+с подсказкой, как установить ресурс заранее.
+"""
+
+import nltk
+import re
+from config import NLTK_OFFLINE
+
+
+def _version(version):
+    """Первые два числа версии: '3.10.3' -> (3, 10)"""
+
+    return tuple(int(part) for part in re.findall(r'\d+', version)[:2])
+
+
+# NLTK 3.9+ загружает punkt и перцептронный теггер только из новых форматов (punkt_tab,
+# averaged_perceptron_tagger_eng/_rus): старые pickle-ресурсы ему не подходят, даже если установлены
+MODERN_NLTK = _version(nltk.__version__) >= (3, 9)
+
+# Имя ресурса в коде -> (пакет для nltk.download, путь, по которому его ищет nltk.data.find)
+if MODERN_NLTK:
+    RESOURCES = {
+        'averaged_perceptron_tagger': ('averaged_perceptron_tagger_eng', 'taggers/averaged_perceptron_tagger_eng'),
+        'averaged_perceptron_tagger_ru': ('averaged_perceptron_tagger_rus', 'taggers/averaged_perceptron_tagger_rus'),
+        'punkt': ('punkt_tab', 'tokenizers/punkt_tab'),
+        'stopwords': ('stopwords', 'corpora/stopwords'),
+        'wordnet': ('wordnet', 'corpora/wordnet'),
+    }
+else:
+    RESOURCES = {
+        'averaged_perceptron_tagger': ('averaged_perceptron_tagger', 'taggers/averaged_perceptron_tagger'),
+        'averaged_perceptron_tagger_ru': ('averaged_perceptron_tagger_ru', 'taggers/averaged_perceptron_tagger_ru'),
+        'punkt': ('punkt', 'tokenizers/punkt'),
+        'stopwords': ('stopwords', 'corpora/stopwords'),
+        'wordnet': ('wordnet', 'corpora/wordnet'),
+    }
+
+# Ресурсы, уже проверенные в текущем процессе
+_checked = set()
+
+
+def is_installed(name):
+    """Проверяет, что ресурс в формате, нужном установленной версии NLTK, есть в одном из каталогов nltk.data.path"""
+
+    _, path = RESOURCES.get(name, (name, name))
+    try:
+        nltk.data.find(path)
+        return True
+    except LookupError:
+        return False
+
+
+def require(*names, offline=None):
+    """
+    Убеждается, что ресурсы NLTK доступны, при необходимости скачивая их.
+
+    offline=None берет режим из config.NLTK_OFFLINE. Повторные вызовы для уже проверенных
+    ресурсов ничего не стоят.
+    """
+
+    if offline is None:
+        offline = NLTK_OFFLINE
+
+    for name in names:
+        if name in _checked:
+            continue
+
+        if not is_installed(name):
+            package, _ = RESOURCES.get(name, (name, name))
+            if offline:
+                raise LookupError(
+                    "Ресурс NLTK '{0}' не найден, а скачивание отключено (офлайн-режим). "
+                    "Установите его заранее: python -m nltk.downloader {0}".format(package)
+                )
+            if not nltk.download(package, quiet=True) or not is_installed(name):
+                raise LookupError("Не удалось скачать ресурс NLTK '{}'".format(package))
+
+        _checked.add(name)
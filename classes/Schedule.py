@@ -0,0 +1,51 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Планирование обработки корпуса по размерам файлов.
+
+Если большой файл попадает в пул последним, все процессы, кроме одного, простаивают, пока он
+обрабатывается. Поэтому файлы отдаются в пул от больших к меньшим: большие начинаются сразу,
+а мелкие заполняют процессы в конце прогона.
+
+Размеры берутся из HTMLCorpusReader.sizes(). По размерам и времени обработки в отчет прогона
+попадают выбросы - файлы, заметно превосходящие типичный (медианный) по размеру или времени.
+"""
+
+from statistics import median
+
+
+def file_sizes(corpus, fileids):
+    """Возвращает словарь fileid -> размер файла в байтах"""
+
+    return {fileid: size for fileid, (_, size) in zip(fileids, corpus.sizes(fileids))}
+
+
+def order_by_size(fileids, sizes):
+    """Упорядочивает файлы по убыванию размера (при равных размерах - в исходном порядке)"""
+
+    return sorted(fileids, key=lambda fileid: -sizes[fileid])
+
+
+def find_outliers(rows, limit=10, factor=5):
+    """
+    Отбирает выбросы среди записей о файлах.
+
+    rows - словари с ключами fileid, size и secs. Выброс - файл, который больше медианного в factor
+    раз по размеру или по времени обработки. Возвращается не больше limit выбросов, от больших к меньшим.
+    """
+
+    if not rows:
+        return []
+
+    typical_size = median(row['size'] for row in rows)
+    typical_secs = median(row['secs'] for row in rows)
+
+    outliers = [
+        row for row in rows
+        if (typical_size and row['size'] > factor * typical_size)
+        or (typical_secs and row['secs'] > factor * typical_secs)
+    ]
+    outliers.sort(key=lambda row: (row['size'], row['secs']), reverse=True)
+
+    return outliers[:limit]
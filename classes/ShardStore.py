@@ -0,0 +1,190 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Упакованное хранилище обработанного корпуса: несколько больших файлов-шардов вместо .pickle на документ.
+
+При миллионах коротких документов основное время уходит на открытие и stat отдельных файлов и на
+обход каталога с PKL_PATTERN в конструкторе CorpusReader. Здесь документы подряд дописываются
+в шарды shard-00000.bin, shard-00001.bin, ... (в том же покадровом формате, что и .pickle-файлы),
+а index.tsv хранит для каждого документа строку: fileid, категория, номер шарда, смещение, длина.
+
+Шарды и индекс одной записи лежат в отдельном каталоге версии (v00001, v00002, ...), а файл CURRENT
+в корне хранилища указывает на последнюю полностью записанную версию и заменяется последним, одним
+атомарным шагом (см. Manifest.publish_version). Поэтому ни при перезаписи хранилища, ни после падения
+читатель не увидит индекс, указывающий на чужие шарды. Хранилища старого вида (шарды и index.tsv прямо
+в корне, без CURRENT) читаются как раньше.
+
+PickledCorpusReader(root, shards=True) берет fileids(), categories() и resolve() из индекса,
+не обходя каталог, а документы читает по смещению из шарда.
+
+Существующий корпус из отдельных .pickle-файлов упаковывается командой:
+python -m classes.ShardStore <каталог .pickle-файлов> <каталог шардов> [размер шарда в МБ]
+"""
+
+import io
+import os
+import re
+import sys
+from classes.CustomCorpusReader import CAT_PATTERN
+from classes.Manifest import atomic_open, current_version, new_version, publish_version
+from classes.PickleFrames import FrameWriter, read_document, stream_document
+
+INDEX_NAME = 'index.tsv'
+SHARD_PATTERN = re.compile(r'shard-\d{5}\.bin$')
+SHARD_SIZE = 256 * 1024 * 1024  # после этого размера начинается новый шард
+
+
+def shard_name(number):
+    return 'shard-{:05d}.bin'.format(number)
+
+
+def shard_root(root):
+    """
+    Возвращает каталог текущей версии хранилища root (для хранилища старого вида - сам root).
+
+    Индекс и шарды нужно читать из одного и того же каталога: если хранилище перезапишут, пока его читают,
+    текущей станет другая версия, а прочитанная останется на месте (см. Manifest.publish_version).
+    """
+
+    version = current_version(root)
+    if version is None:
+        return root
+
+    return os.path.join(root, version)
+
+
+def read_shard_index(path):
+    """Возвращает список записей индекса (fileid, категория, шард, смещение, длина) из каталога версии path"""
+
+    entries = []
+    with open(os.path.join(path, INDEX_NAME), 'r', encoding='utf-8') as f:
+        for line in f:
+            fileid, category, shard, offset, length = line.rstrip('\n').split('\t')
+            entries.append((fileid, category, int(shard), int(offset), int(length)))
+
+    return entries
+
+
+def read_shard_documents(path, entries):
+    """Читает документы по записям индекса из каталога версии path, держа открытыми только нужные шарды"""
+
+    files = {}
+    try:
+        for fileid, category, shard, offset, length in entries:
+            if shard not in files:
+                files[shard] = open(os.path.join(path, shard_name(shard)), 'rb')
+
+            f = files[shard]
+            f.seek(offset)
+            yield read_document(io.BytesIO(f.read(length)))
+    finally:
+        for f in files.values():
+            f.close()
+
+
+def stream_shard_documents(path, entries):
+    """
+    Как read_shard_documents, но каждый документ - генератор абзацев, читаемых из шарда по одному кадру.
+
+    Каждый документ читается через свой файловый объект, поэтому документы можно читать в любом порядке.
+    """
+
+    for fileid, category, shard, offset, length in entries:
+        yield stream_document(os.path.join(path, shard_name(shard)), offset, length)
+
+
+class ShardWriter(object):
+
+    """Дописывает документы в шарды новой версии хранилища и при закрытии делает ее текущей"""
+
+    def __init__(self, root, cat_pattern=CAT_PATTERN, shard_size=SHARD_SIZE, keep=2):
+        """keep - сколько последних версий хранилища оставлять (см. Manifest.publish_version)"""
+
+        self.root = root
+        self.cat_pattern = cat_pattern
+        self.shard_size = shard_size
+        self.keep = keep
+
+        self.version = new_version(root)
+        self.path = os.path.join(root, self.version)
+
+        self.entries = []
+        self.shard = -1
+        self.f = None
+        self.next_shard()
+
+    def next_shard(self):
+        """Закрывает текущий шард и начинает следующий"""
+
+        self.close_shard()
+        self.shard += 1
+        self.f = open(os.path.join(self.path, shard_name(self.shard)), 'wb')
+
+    def close_shard(self):
+        if self.f is None:
+            return
+
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.f.close()
+        self.f = None
+
+    def add(self, fileid, document):
+        """Дописывает документ в текущий шард"""
+
+        if self.f.tell() >= self.shard_size:
+            self.next_shard()
+
+        offset = self.f.tell()
+        writer = FrameWriter(self.f)
+        for para in document:
+            writer.write(para)
+        writer.close()
+
+        category = re.match(self.cat_pattern, fileid).group(1)
+        self.entries.append((fileid, category, self.shard, offset, self.f.tell() - offset))
+
+    def close(self):
+        """
+        Закрывает последний шард, записывает индекс версии и публикует ее заменой CURRENT.
+
+        Шарды и index.tsv хранилища старого вида из корня удаляются после публикации.
+        """
+
+        self.close_shard()
+
+        with atomic_open(os.path.join(self.path, INDEX_NAME), 'w', encoding='utf-8') as f:
+            for entry in self.entries:
+                f.write('\t'.join(str(field) for field in entry) + '\n')
+
+        publish_version(self.root, self.version, self.keep)
+
+        for name in os.listdir(self.root):
+            if SHARD_PATTERN.match(name) or name == INDEX_NAME:
+                os.remove(os.path.join(self.root, name))
+
+
+def compact(source, target, shard_size=SHARD_SIZE):
+    """Упаковывает корпус из отдельных .pickle-файлов каталога source в шарды в каталоге target"""
+
+    # Импорт здесь, т.к. PickledCorpusReader сам импортирует этот модуль
+    from classes.PickledCorpusReader import PickledCorpusReader
+
+    reader = PickledCorpusReader(source)
+    writer = ShardWriter(target, shard_size=shard_size)
+    for fileid, document in zip(reader.fileids(), reader.docs()):
+        writer.add(fileid, document)
+    writer.close()
+
+    return len(writer.entries), writer.shard + 1
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (3, 4):
+        print(__doc__)
+        sys.exit(1)
+
+    size = int(sys.argv[3]) * 1024 * 1024 if len(sys.argv) == 4 else SHARD_SIZE
+    docs, shards = compact(sys.argv[1], sys.argv[2], size)
+    print('Упаковано документов: {}, шардов: {}'.format(docs, shards))
@@ -0,0 +1,86 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Упрощенная лексемизация со стеммингом для векторизаторов из BagOfWords.
+
+Стеммер создается один раз на объект (а не на каждый документ), основы слов запоминаются в
+LRU-кеше - из-за закона Ципфа почти все лексемы корпуса уже встречались, а знаки препинания
+отсеиваются проверкой по frozenset.
+"""
+
+import string
+import nltk
+from classes.LRUCache import LRUCache, MISSING
+from classes.Parallel import imap
+from classes.Resources import require
+
+PUNCTUATION = frozenset(string.punctuation)
+
+
+class StemmingTokenizer(object):
+
+    def __init__(self, language='russian', cache_size=100000):
+        self.language = language
+        self.cache_size = cache_size
+        self.cache = LRUCache(cache_size)
+        self._stemmer = None
+
+    def __getstate__(self):
+        # Процессам пула кеш не передаем, каждый накопит свой
+        state = self.__dict__.copy()
+        state['cache'] = LRUCache(self.cache_size)
+        return state
+
+    @property
+    def stemmer(self):
+        if self._stemmer is None:
+            self._stemmer = nltk.stem.SnowballStemmer(self.language)
+
+        return self._stemmer
+
+    def stem(self, token):
+        """Возвращает основу лексемы, по возможности из кеша"""
+
+        stem = self.cache.get(token)
+        if stem is MISSING:
+            stem = self.stemmer.stem(token)
+            self.cache.set(token, stem)
+
+        return stem
+
+    def stem_tokens(self, tokens):
+        """Отбрасывает знаки препинания и возвращает список основ уже выделенных лексем"""
+
+        return [self.stem(token) for token in tokens if token not in PUNCTUATION]
+
+    def tokenize(self, text):
+        """
+        Приводит текст к нижнему регистру, выделяет лексемы с помощью word_tokenize,
+        отбрасывает знаки препинания и возвращает список основ.
+        """
+
+        require('punkt')
+        return self.stem_tokens(nltk.word_tokenize(text.lower()))
+
+    def tokenize_document(self, document):
+        """
+        Лексемизирует документ, заданный строкой или уже выделенными лексемами
+        (например, PickledCorpusReader.words() одного документа) - они только приводятся
+        к нижнему регистру и стеммируются.
+        """
+
+        if isinstance(document, str):
+            return self.tokenize(document)
+
+        return self.stem_tokens(token.lower() for token in document)
+
+    def tokenize_many(self, texts, n_jobs=None, chunksize=64):
+        """
+        Лексемизирует пачку документов (строк или списков лексем, см. tokenize_document),
+        возвращая генератор списков основ в порядке texts.
+
+        При n_jobs > 1 документы обрабатываются в пуле процессов порциями по chunksize.
+        """
+
+        return imap(self.tokenize_document, texts, n_jobs, chunksize)
@@ -0,0 +1,103 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Разметка частей речи с одним загруженным теггером.
+
+Tagger держит модель теггера в объекте: загружает ее один раз (лениво, при первой разметке), размечает
+предложения пачками - абзацем или документом - и может запоминать уже размеченные предложения:
+на веб-страницах много повторяющихся шаблонных фраз (меню, подписи, копирайты).
+
+Модель загружается так же, как ее загружает pos_tag: в NLTK 3.9+ - публичным конструктором
+PerceptronTagger (сам pos_tag кеширует модель через lru_cache, так что повторной загрузки нет и без Tagger),
+в более старых версиях - приватной nltk.tag._get_tagger, а если ее нет - разметка идет через сам pos_tag.
+
+Результат совпадает с pos_tag(wordpunct_tokenize(sent), lang='rus') для каждого предложения.
+"""
+
+from functools import partial
+from nltk import (pos_tag, sent_tokenize, wordpunct_tokenize)
+from nltk.tag.perceptron import PerceptronTagger
+from classes.LRUCache import LRUCache, MISSING
+from classes.Resources import MODERN_NLTK, require
+
+# Ресурсы NLTK, нужные теггеру для каждого языка
+TAGGER_RESOURCES = {
+    'rus': 'averaged_perceptron_tagger_ru',
+    'eng': 'averaged_perceptron_tagger',
+}
+
+
+def load_tagger(lang):
+    """Возвращает функцию разметки списка лексем моделью, которую pos_tag использует для языка lang"""
+
+    if MODERN_NLTK:
+        # То же, что делает nltk.tag._get_tagger в NLTK 3.9+, но через публичный конструктор
+        return (PerceptronTagger(lang=lang) if lang == 'rus' else PerceptronTagger()).tag
+
+    try:
+        # В NLTK до 3.9 русская модель загружается только внутри pos_tag, отдельно - лишь так
+        from nltk.tag import _get_tagger
+    except ImportError:
+        return partial(pos_tag, lang=lang)
+
+    return _get_tagger(lang).tag
+
+
+class Tagger(object):
+
+    def __init__(self, lang='rus', memoize=True, cache_size=100000):
+        """
+        lang - язык модели для pos_tag,
+        memoize - запоминать размеченные предложения,
+        cache_size - сколько предложений помнить.
+        """
+
+        self.lang = lang
+        self.memoize = memoize
+        self.cache_size = cache_size
+        self.cache = LRUCache(cache_size) if memoize else None
+        self._tagger = None
+
+    def __getstate__(self):
+        # В процессы пула не передаем ни загруженную модель, ни накопленный кеш: каждый процесс
+        # загрузит модель один раз при первой разметке
+        state = self.__dict__.copy()
+        state['_tagger'] = None
+        state['cache'] = LRUCache(self.cache_size) if self.memoize else None
+        return state
+
+    @property
+    def tagger(self):
+        """Функция разметки списка лексем, модель для которой загружается при первом обращении"""
+
+        if self._tagger is None:
+            require(TAGGER_RESOURCES[self.lang])
+            self._tagger = load_tagger(self.lang)
+
+        return self._tagger
+
+    def tag_sents(self, sents):
+        """Размечает пачку предложений (списков лексем), возвращая списки кортежей (token, tag)"""
+
+        tagger = self.tagger
+        if self.cache is None:
+            return [tagger(tokens) for tokens in sents]
+
+        tagged = []
+        for tokens in sents:
+            key = tuple(tokens)
+            result = self.cache.get(key)
+            if result is MISSING:
+                result = tagger(tokens)
+                self.cache.set(key, result)
+            # Копия, чтобы изменение результата не испортило запомненное значение
+            tagged.append(list(result))
+
+        return tagged
+
+    def tag_paragraph(self, paragraph):
+        """Делит абзац на предложения и лексемы и размечает все его предложения одной пачкой"""
+
+        require('punkt')
+        return self.tag_sents([wordpunct_tokenize(sent) for sent in sent_tokenize(paragraph)])
@@ -38,22 +38,64 @@ P.S. К другим методам преобразования текста д
 
 import nltk
 from nltk.stem import WordNetLemmatizer
-from nltk.corpus import wordnet as wn
+from nltk.corpus.reader.wordnet import (NOUN, VERB, ADV, ADJ)
 import unicodedata
 from sklearn.base import BaseEstimator, TransformerMixin
+from classes.LRUCache import LRUCache, MISSING
+from classes.Parallel import imap
+from classes.Resources import require
 
-nltk.download('stopwords')
-nltk.download('wordnet')
+# Теги частей речи pos_tag -> теги WordNet. Константы берутся из модуля чтения WordNet,
+# а не из nltk.corpus.wordnet, чтобы не загружать WordNet при импорте.
+WORDNET_TAGS = {
+    'S': NOUN,
+    'V': VERB,
+    'ADV': ADV,
+    'A': ADJ
+}
 
 
 class TextNormalizer(BaseEstimator, TransformerMixin):
 
-    def __init__(self, language='russian'):
-        """Принимает на вход язык, используемый для загрузки правильного набора стоп-слов из NLTK."""
+    def __init__(self, language='russian', cache_size=100000, cache=None, n_jobs=None, chunksize=16, lazy=True):
+        """
+        Принимает на вход язык, используемый для загрузки правильного набора стоп-слов из NLTK.
+
+        Результат нормализации каждой пары (token, tag) запоминается в кеше на cache_size записей.
+        Через cache можно передать готовый LRUCache - общий для нескольких нормализаторов
+        или загруженный с диска (LRUCache.load) после прошлого запуска. Без него свой кеш создается
+        при первой нормализации (см. get_cache), т.к. __init__ оценщика Scikit-Learn только сохраняет параметры.
+
+        n_jobs - число процессов для transform (None или 1 - без пула, -1 - все ядра),
+        chunksize - сколько документов отдавать процессу пула за раз,
+        lazy - transform возвращает генератор (True) или сразу список (False).
+        """
 
+        self.language = language
+        self.cache_size = cache_size
+        self.cache = cache
+        self.n_jobs = n_jobs
+        self.chunksize = chunksize
+        self.lazy = lazy
+
+        require('stopwords')
         self.stopwords = set(nltk.corpus.stopwords.words(language))
         self.lemmatizer = WordNetLemmatizer()
 
+        # Собственный кеш нормализации, если cache не передан
+        self._cache = None
+
+    def get_cache(self):
+        """Возвращает кеш нормализации: переданный в cache или собственный, создаваемый при первом обращении"""
+
+        if self.cache is not None:
+            return self.cache
+
+        if self._cache is None:
+            self._cache = LRUCache(self.cache_size)
+
+        return self._cache
+
     def is_punct(self, token):
         """Сравнивает первую букву в названии категории Юникода каждого символа с P (Punctuation)"""
 
@@ -64,21 +106,41 @@ class TextNormalizer(BaseEstimator, TransformerMixin):
 
         return token.lower() in self.stopwords
 
+    def normalize_token(self, token, tag):
+        """Возвращает нормализованную форму лексемы или None, если лексему нужно отбросить"""
+
+        if self.is_punct(token) or self.is_stopword(token):
+            return None
+
+        return self.lemmatize(token, tag).lower()
+
     def normalize(self, document):
         """
         Применяет функции фильтрации для удаления нежелательных лексем и выполняет лемматиизацию
 
         Принимает document, являющиеся списком абзацев, состоящих из списка предложений, которые
         представлены списками кортежей (token, tag)
+
+        Распределение лексем подчиняется закону Ципфа, поэтому почти все пары (token, tag)
+        уже встречались раньше и их форма берется из кеша.
         """
 
-        return [
-            self.lemmatize(token, tag).lower()
-            for paragraph in document
-            for sentence in paragraph
-            for (token, tag) in sentence
-            if not self.is_punct(token) and not self.is_stopword(token)
-        ]
+        require('wordnet')
+        cache = self.get_cache()
+        normalized = []
+
+        for paragraph in document:
+            for sentence in paragraph:
+                for key in sentence:
+                    form = cache.get(key)
+                    if form is MISSING:
+                        form = self.normalize_token(*key)
+                        cache.set(key, form)
+
+                    if form is not None:
+                        normalized.append(form)
+
+        return normalized
 
     def lemmatize(self, token, pos_tag):
         """
@@ -86,19 +148,35 @@ class TextNormalizer(BaseEstimator, TransformerMixin):
         в теги WordNet, выбирая по умолчению существительное.
         """
 
-        tag = {
-            'S': wn.NOUN,
-            'V': wn.VERB,
-            'ADV': wn.ADV,
-            'A': wn.ADJ
-        }.get(pos_tag, wn.NOUN)
+        return self.lemmatizer.lemmatize(token, WORDNET_TAGS.get(pos_tag, NOUN))
+
+    def cache_info(self):
+        """Счетчики кеша нормализации: попадания, промахи, размер"""
+
+        return self.get_cache().info()
+
+    def save_cache(self, path):
+        """Сохраняет кеш нормализации на диск, чтобы передать его в следующий запуск через LRUCache.load"""
 
-        return self.lemmatizer.lemmatize(token, tag)
+        self.get_cache().save(path)
 
     def fit(self, X, y=None):
         return self
 
     def transform(self, documents):
-        for document in documents:
-            print(document)
-            yield self.normalize(document)
+        """
+        Нормализует документы, сохраняя их порядок.
+
+        При n_jobs > 1 документы нормализуются в пуле процессов порциями по chunksize. У каждого
+        процесса свой кеш нормализации (копия кеша на момент запуска), в кеш текущего процесса
+        результаты процессов не попадают.
+
+        При lazy=True возвращается генератор, и документы читаются из documents (например,
+        PickledCorpusReader.docs()) по мере потребления. При lazy=False возвращается список.
+        """
+
+        normalized = imap(self.normalize, documents, self.n_jobs, self.chunksize)
+        if self.lazy:
+            return normalized
+
+        return list(normalized)
@@ -0,0 +1,128 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TF-IDF по инвертированному индексу частот документов.
+
+TextCollection.tf_idf из NLTK для каждого слова каждого документа заново просматривает все тексты,
+чтобы посчитать обратную частоту документа, т.е. работает примерно за O(словарь * документы * длина).
+Здесь частоты документов (в скольких документах встречается слово) собираются за один проход,
+после чего каждый документ превращается в строку разреженной матрицы CSR.
+
+По умолчанию оценки совпадают с TextCollection:
+tf(t,d) = f(t,d) / len(d), idf(t,D) = log(N / nt).
+sublinear_tf=True дает логарифмическую частоту из описания BagOfWords: tf(t,d) = 1 + log(f(t,d)),
+smooth_idf=True - idf(t,D) = log(1 + N / nt).
+
+Словарь и idf запоминаются в fit, поэтому можно обучиться на одном корпусе, а преобразовать другой:
+слова, которых не было при обучении, отбрасываются (но учитываются в длине документа).
+"""
+
+from array import array
+from collections import Counter
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.base import BaseEstimator, TransformerMixin
+
+
+class TfidfIndex(BaseEstimator, TransformerMixin):
+
+    def __init__(self, sublinear_tf=False, smooth_idf=False, norm=None, dtype=np.float64):
+        """
+        Документы - списки лексем (например, результат StemmingTokenizer.tokenize).
+
+        norm='l2' нормирует каждую строку матрицы на единичную длину, None - без нормировки.
+        """
+
+        self.sublinear_tf = sublinear_tf
+        self.smooth_idf = smooth_idf
+        self.norm = norm
+        self.dtype = dtype
+
+    def count(self, documents, vocabulary, grow):
+        """
+        Считает частоты слов в документах за один проход.
+
+        Возвращает CSR-матрицу частот и длины документов. При grow=True новые слова добавляются
+        в vocabulary, иначе отбрасываются.
+        """
+
+        indptr = array('q', [0])
+        indices = array('i')
+        counts = array('i')
+        lengths = array('q')
+
+        for document in documents:
+            terms = Counter(document)
+            lengths.append(sum(terms.values()))
+
+            row = []
+            for term, count in terms.items():
+                index = vocabulary.get(term)
+                if index is None:
+                    if not grow:
+                        continue
+                    index = vocabulary[term] = len(vocabulary)
+                row.append((index, count))
+
+            row.sort()
+            indices.extend(index for index, _ in row)
+            counts.extend(count for _, count in row)
+            indptr.append(len(indices))
+
+        matrix = csr_matrix(
+            (np.frombuffer(counts, dtype=np.int32), np.frombuffer(indices, dtype=np.int32),
+             np.frombuffer(indptr, dtype=np.int64)),
+            shape=(len(lengths), len(vocabulary))
+        )
+
+        return matrix, np.frombuffer(lengths, dtype=np.int64)
+
+    def fit(self, documents, y=None):
+        self.fit_transform(documents)
+        return self
+
+    def fit_transform(self, documents, y=None):
+        """Строит словарь и частоты документов и сразу возвращает матрицу TF-IDF - за один проход"""
+
+        self.vocabulary_ = {}
+        counts, lengths = self.count(documents, self.vocabulary_, grow=True)
+
+        # Число документов, в которых встречается каждое слово
+        self.df_ = np.bincount(counts.indices, minlength=len(self.vocabulary_))
+        self.n_docs_ = counts.shape[0]
+
+        ratio = self.n_docs_ / np.maximum(self.df_, 1)
+        self.idf_ = np.log(1 + ratio if self.smooth_idf else ratio)
+
+        return self.weigh(counts, lengths)
+
+    def transform(self, documents):
+        """Возвращает матрицу TF-IDF документов по словарю и idf, полученным в fit"""
+
+        counts, lengths = self.count(documents, self.vocabulary_, grow=False)
+        return self.weigh(counts, lengths)
+
+    def weigh(self, counts, lengths):
+        """Переводит матрицу частот в оценки TF-IDF"""
+
+        data = counts.data.astype(self.dtype)
+        if self.sublinear_tf:
+            data = 1 + np.log(data)
+        else:
+            # Делим на длину документа, которому принадлежит каждый ненулевой элемент
+            data /= np.repeat(np.maximum(lengths, 1), np.diff(counts.indptr))
+
+        data *= self.idf_[counts.indices]
+        matrix = csr_matrix((data, counts.indices, counts.indptr), shape=counts.shape)
+
+        if self.norm == 'l2':
+            norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+            matrix.data /= np.repeat(np.where(norms > 0, norms, 1), np.diff(matrix.indptr))
+
+        return matrix
+
+    def get_feature_names(self):
+        """Слова словаря в порядке столбцов матрицы"""
+
+        return sorted(self.vocabulary_, key=self.vocabulary_.get)
@@ -0,0 +1,59 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Компактное временное хранилище документов в виде идентификаторов лексем.
+
+Используется для потоковой векторизации: при первом проходе по корпусу каждый документ лексемизируется
+один раз, а его лексемы, переведенные в идентификаторы словаря, дописываются во временный файл
+массивом int32. Второй проход (построение векторов) читает документы из этого файла, не повторяя
+лексемизацию и не держа корпус в памяти - в памяти остаются только смещения документов (8 байт на документ).
+"""
+
+from array import array
+import tempfile
+
+ITEMSIZE = array('i').itemsize
+
+
+class TokenIdStore(object):
+
+    def __init__(self, dir=None):
+        """dir - каталог для временного файла, None - системный каталог временных файлов"""
+
+        self.file = tempfile.TemporaryFile(dir=dir)
+        # Смещение начала каждого документа в лексемах и общее число лексем в конце
+        self.offsets = array('q', [0])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, ids):
+        """Дописывает документ - последовательность идентификаторов лексем"""
+
+        ids = array('i', ids)
+        self.file.seek(0, 2)
+        ids.tofile(self.file)
+        self.offsets.append(self.offsets[-1] + len(ids))
+
+    def __iter__(self):
+        """Генератор документов в порядке добавления, каждый - array('i') идентификаторов"""
+
+        self.file.flush()
+        for start, end in zip(self.offsets, self.offsets[1:]):
+            ids = array('i')
+            if end > start:
+                self.file.seek(start * ITEMSIZE)
+                ids.fromfile(self.file, end - start)
+            yield ids
+
+    def close(self):
+        """Закрывает и удаляет временный файл"""
+
+        self.file.close()
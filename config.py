@@ -3,3 +3,9 @@ import os
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 CORPUS_ROOT = f'{PROJECT_ROOT}/resources/corpus/'
 CORPUS_PREPROC_ROOT = f'{PROJECT_ROOT}/resources/preprocessed/'
+
+# Не скачивать ресурсы NLTK, а только проверять их наличие (для узлов без доступа в сеть)
+NLTK_OFFLINE = os.environ.get('TEXTANALYSIS_OFFLINE', '') not in ('', '0')
+
+# Каталог для кешей, которые не должны лежать внутри корпуса (например, индекс файлов корпуса)
+CACHE_ROOT = os.environ.get('TEXTANALYSIS_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'textanalysis')
@@ -0,0 +1,36 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+from classes.ArrayCorpusReader import ArrayCorpusReader, ArrayCorpusWriter
+from classes.PickledCorpusReader import PickledCorpusReader
+from config import CORPUS_PREPROC_ROOT
+
+ARRAYS_ROOT = os.path.join(os.path.dirname(os.path.normpath(CORPUS_PREPROC_ROOT)), 'arrays')
+
+pickled_reader = PickledCorpusReader(CORPUS_PREPROC_ROOT)
+ArrayCorpusWriter.convert(pickled_reader, ARRAYS_ROOT)
+array_reader = ArrayCorpusReader(ARRAYS_ROOT)
+
+print('Документы корпуса', array_reader.fileids())
+print('Категории корпуса', array_reader.categories())
+print('Размер словаря', len(array_reader.vocab), 'тегов', len(array_reader.tagset))
+
+print()
+print()
+
+print('Идентификаторы лексем документа (срез массива в памяти)')
+print(array_reader.token_ids('Category 1/document2.pickle'))
+
+print()
+print()
+
+print('Совпадают ли документы с исходным корпусом')
+print(list(array_reader.docs()) == list(pickled_reader.docs()))
+
+print()
+print()
+
+print('Выделенные кортежи лексем и маркеров из предложений')
+for word, tag in array_reader.tagged(['Category 1/document2.pickle']):
+    print("{} = {}".format(word, tag))
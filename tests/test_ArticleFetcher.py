@@ -0,0 +1,70 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from classes.ArticleFetcher import ArticleFetcher
+from classes.CustomCorpusReader import HTMLCorpusReader
+
+PAGES = {
+    '/articles/kabachki': '<html><body><p>Идеально для оладий подходят молоденькие кабачки.</p></body></html>',
+    '/articles/farsh': '<html><body><p>В сковороду выложить фарш и обжарить на среднем огне.</p></body></html>',
+    '/recipes/farsh': '<html><body><p>Фарш посолить, поперчить и хорошо перемешать.</p></body></html>',
+}
+hits = []
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    """Локальный сервер вместо сайта: отдает страницы с ETag и отвечает 304 на условный запрос"""
+
+    def do_GET(self):
+        hits.append(self.path)
+        if self.path not in PAGES:
+            self.send_error(404)
+            return
+
+        etag = '"{}"'.format(len(PAGES[self.path]))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = PAGES[self.path].encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base = 'http://127.0.0.1:{}'.format(server.server_port)
+
+root = tempfile.mkdtemp()
+articles = [(base + path, 'Category 1') for path in PAGES] + [(base + '/missing', 'Category 1')]
+
+with ArticleFetcher(root, cache=os.path.join(root, '.cache'), max_workers=4, rate=20, retries=1, timeout=5) as fetcher:
+    print('Первая загрузка')
+    for result in fetcher.fetch_all(articles):
+        print(result)
+
+    print('Повторная загрузка - страницы не изменились, сервер отвечает 304')
+    for result in fetcher.fetch_all(articles):
+        print(result)
+
+    print('Одинаковые имена документов разных адресов различаются хешем адреса, неверная категория отвергается')
+    for result in fetcher.fetch_all([(base + '/recipes/farsh', 'Category 1'), (base + '/articles/farsh', 'no/such')]):
+        print(result)
+
+print('Запросов к серверу:', len(hits))
+print('Документы корпуса', HTMLCorpusReader(root).fileids())
+
+server.shutdown()
@@ -0,0 +1,20 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from classes.BagOfWords import gensim_logical_vectorize, gensim_tfidf_vectorize, gensim_vectorize
+
+corpus = [
+    "Идеально для оладий подходят молоденькие кабачки и цуккини. Для жарки кабачков используем масло и гриль.",
+    "В сковороду выложить фарш и обжарить на среднем огне, до готовности, постоянно разминая деревянной лопаткой, "
+    "чтобы разбить крупные комки.",
+    "Вкусный и полезный ужин из запеченных кабачков с фаршем, помидорами и сыром, любителям жаркого!",
+]
+
+# Потоковый режим принимает генератор, читает его один раз и дает те же векторы, что и режим в памяти
+for vectorize in (gensim_vectorize, gensim_logical_vectorize, gensim_tfidf_vectorize):
+    in_memory = vectorize(corpus)
+    streamed = vectorize((text for text in corpus), stream=True)
+    print('{}: потоковый результат - генератор {}, совпадает с результатом в памяти - {}'.format(
+        vectorize.__name__, not isinstance(streamed, list), list(streamed) == in_memory))
+
+print('С пулом процессов:', list(gensim_vectorize(iter(corpus), n_jobs=2, stream=True)) == gensim_vectorize(corpus))
@@ -1,7 +1,11 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from classes.CustomCorpusReader import HTMLCorpusReader
+import os
+import shutil
+import tempfile
+from classes.CorpusIndex import CorpusIndex, default_path
+from classes.CustomCorpusReader import CAT_PATTERN, DOC_PATTERN, HTMLCorpusReader
 from config import CORPUS_ROOT
 
 html_reader = HTMLCorpusReader(CORPUS_ROOT)
@@ -10,6 +14,32 @@ print('Категории корпуса', html_reader.categories())
 print('Документы категории Category 1 и Category N корпуса', html_reader.resolve(None, ['Category 1', 'Category N']))
 print('Документы, которые нужны явно указанные', html_reader.resolve(['document3.txt', 'document1.txt', 'some123'], None))
 
+# Файлы и категории из сохраненного индекса корпуса: при следующем создании обход корня не нужен
+indexed_reader = HTMLCorpusReader(CORPUS_ROOT, index=True)
+print('Индекс совпадает с обходом корня', indexed_reader.fileids() == html_reader.fileids())
+print('Документы категории Category 1 по индексу', indexed_reader.resolve(None, 'Category 1'))
+print('Индекс по умолчанию лежит вне корпуса:',
+      not os.path.abspath(default_path(CORPUS_ROOT, DOC_PATTERN, CAT_PATTERN)).startswith(os.path.abspath(CORPUS_ROOT)))
+
+# Устаревание индекса на копии корпуса: добавление и удаление файла, смена mtime каталога категории
+source = os.path.join(tempfile.mkdtemp(), 'corpus')
+shutil.copytree(CORPUS_ROOT, source)
+corpus_index = CorpusIndex(source, DOC_PATTERN, CAT_PATTERN, os.path.join(tempfile.mkdtemp(), 'index.json'))
+corpus_index.load()
+print('Только что построенный индекс актуален:', corpus_index.fresh(corpus_index.read()))
+
+shutil.copy(os.path.join(source, 'Category 1', 'document2.txt'), os.path.join(source, 'Category 1', 'document6.txt'))
+print('Файл добавлен, индекс актуален:', corpus_index.fresh(corpus_index.read()))
+print('Новый файл в перестроенном индексе:', 'Category 1/document6.txt' in corpus_index.entries()[0])
+
+os.remove(os.path.join(source, 'Category 1', 'document6.txt'))
+print('Файл удален, индекс актуален:', corpus_index.fresh(corpus_index.read()))
+print('Удаленного файла нет в перестроенном индексе:', 'Category 1/document6.txt' not in corpus_index.entries()[0])
+
+stat = os.stat(os.path.join(source, 'Category 2'))
+os.utime(os.path.join(source, 'Category 2'), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+print('Изменен mtime каталога категории, индекс актуален:', corpus_index.fresh(corpus_index.read()))
+
 print()
 print()
 
@@ -60,6 +90,14 @@ print()
 print()
 """
 
+print('Один разбор документа: абзацы, предложения и лексемы из одной записи')
+for record in html_reader.records(['Category 1/document2.txt']):
+    print(record.fileid, 'абзацев:', len(record.paras), 'предложений:', sum(len(para) for para in record.sents))
+    print(record.words[0])
+
+print()
+print()
+
 print('Маркировка лексем в документе кортежем (тег, токен)')
 tokens = html_reader.tokenize(['Category 1/document2.txt'])
 for token in tokens:
@@ -0,0 +1,59 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import numpy as np
+from gensim.corpora import Dictionary
+from classes.GensimVectorizer import GensimVectorizer, VOCAB_NAME
+from classes.MappedVocabulary import MappedVocabulary
+
+documents = [
+    ['кабачк', 'для', 'оладь', 'кабачк', 'и', 'цуккин'],
+    ['фарш', 'обжар', 'на', 'огн', 'и', 'размина', 'фарш'],
+    ['ужин', 'из', 'кабачк', 'с', 'фарш', 'и', 'сыр'],
+]
+root = tempfile.mkdtemp()
+
+# Плотные векторы и матрица CSR совпадают, тип значений задается dtype
+dense = GensimVectorizer(os.path.join(root, 'dense'), dtype=np.int32).fit(documents)
+sparse = GensimVectorizer(os.path.join(root, 'sparse'), output='sparse', dtype=np.int32).fit(documents)
+vectors = np.vstack(list(dense.transform(documents)))
+matrix = sparse.transform(documents)
+print('Плотные и разреженные совпадают:', (vectors == matrix.toarray()).all(), vectors.dtype, matrix.dtype)
+
+# Фильтрация словаря: no_below - по числу документов, keep_n - самые частые, prune_at - размер во время прохода
+print('no_below=2:', sorted(GensimVectorizer(os.path.join(root, 'below'), no_below=2).fit(documents).id2word.token2id))
+print('keep_n=1:', list(GensimVectorizer(os.path.join(root, 'keep'), keep_n=1).fit(documents).id2word.token2id))
+# Gensim проверяет prune_at раз в 10000 документов: к 10000-му документу словарь сжат до 100 слов,
+# и последний документ добавляет еще одно
+unique = [['слово{}'.format(i)] for i in range(10001)]
+print('prune_at=100, слов в словаре:', len(GensimVectorizer(os.path.join(root, 'prune'), prune_at=100).fit(unique).id2word))
+
+# HashDictionary: словарь не обучается и не сохраняется, число столбцов - n_features
+hashing = GensimVectorizer(os.path.join(root, 'hashing'), output='sparse', hashing=True, n_features=16)
+print('Хеширование:', hashing.fit(documents).transform(documents).shape, os.path.exists(hashing.path))
+
+# partial_fit дополняет словарь, не меняя идентификаторы известных слов
+incremental = GensimVectorizer(os.path.join(root, 'partial'), output='sparse').fit(documents[:2])
+before = dict(incremental.id2word.token2id)
+incremental.partial_fit(documents[2:])
+after = incremental.id2word.token2id
+print('partial_fit: идентификаторы сохранены -', all(after[token] == i for token, i in before.items()),
+      'новые слова -', sorted(set(after) - set(before)))
+print('partial_fit дает тот же словарь, что и fit:', sorted(after) == sorted(Dictionary(documents).token2id))
+
+# Сохраненный словарь открывается как MappedVocabulary: те же идентификаторы, незнакомые слова - None
+mapped_path = os.path.join(root, 'mapped')
+trained = GensimVectorizer(mapped_path, output='sparse', mmap=True).fit(documents)
+loaded = GensimVectorizer(mapped_path, output='sparse', mmap=True)
+vocabulary = loaded.id2word
+print('Открыт MappedVocabulary:', isinstance(vocabulary, MappedVocabulary), len(vocabulary) == len(trained.id2word))
+print('Идентификаторы совпадают:',
+      all(vocabulary.lookup(token) == i for token, i in trained.id2word.token2id.items()))
+print('Незнакомые слова:', vocabulary.lookup('баклажан'), 'баклажан' in vocabulary, vocabulary.lookup(''))
+unknown = documents[0] + ['баклажан', 'кабачк']
+print('doc2bow совпадает с Dictionary:', vocabulary.doc2bow(unknown) == trained.id2word.doc2bow(unknown))
+print('transform совпадает:', (loaded.transform(documents) != trained.transform(documents)).nnz == 0)
+print('Словарь напрямую из каталога версии:',
+      MappedVocabulary(os.path.join(loaded.version_path(), VOCAB_NAME)).lookup('фарш') == trained.id2word.token2id['фарш'])
@@ -2,6 +2,15 @@
 # -*- coding: utf-8 -*-
 
 import MaleFemale as mf
+from classes.PickledCorpusReader import PickledCorpusReader
+from config import CORPUS_PREPROC_ROOT
 
 article = mf.get_esquire_article()
-mf.parse_gender(article)
\ No newline at end of file
+mf.parse_gender(article)
+print()
+print('Род предложений по категориям обработанного корпуса')
+
+report = mf.analyze_corpus(PickledCorpusReader(CORPUS_PREPROC_ROOT), n_jobs=2)
+for category, counters in report['categories'].items():
+    print(category, counters)
+print('Весь корпус', report['total'])
@@ -1,8 +1,16 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from classes.Manifest import current_version, list_versions
+from classes.PickleFrames import read_index
 from classes.PickledCorpusReader import PickledCorpusReader
-from config import CORPUS_PREPROC_ROOT
+from classes.ShardStore import compact
+from config import CORPUS_PREPROC_ROOT, PROJECT_ROOT
 
 pickled_reader = PickledCorpusReader(CORPUS_PREPROC_ROOT)
 
@@ -54,3 +62,56 @@ for word, tag in tagged:
 
 print()
 print()
+
+print('Размеры корпуса и документа по индексу, без чтения содержимого')
+print(pickled_reader.counts())
+print(pickled_reader.counts(['Category 1/document2.pickle']))
+
+print()
+print()
+
+print('Абзац 2 и предложение 5 документа, прочитанные по смещению')
+print(pickled_reader.para('Category 1/document2.pickle', 2))
+print(pickled_reader.sent('Category 1/document2.pickle', 5))
+
+print()
+print()
+
+print('Корпус, упакованный в шарды, читается так же, как из отдельных файлов')
+shards_root = tempfile.mkdtemp()
+print('Документов и шардов:', compact(CORPUS_PREPROC_ROOT, shards_root, shard_size=4096))
+sharded_reader = PickledCorpusReader(shards_root, shards=True)
+print(sharded_reader.fileids() == pickled_reader.fileids(), list(sharded_reader.docs()) == list(pickled_reader.docs()))
+
+print('Новая версия публикуется заменой CURRENT, открытый ранее объект чтения дочитывает свою')
+compact(CORPUS_PREPROC_ROOT, shards_root, shard_size=4096)
+print(current_version(shards_root), list_versions(shards_root), list(sharded_reader.docs()) == list(pickled_reader.docs()))
+
+print('При keep=2 хранятся только две последние версии')
+subprocess.check_call([sys.executable, '-m', 'classes.ShardStore', CORPUS_PREPROC_ROOT, shards_root, '1'], cwd=PROJECT_ROOT)
+print(current_version(shards_root), list_versions(shards_root), os.path.exists(sharded_reader.shard_path))
+print(list(PickledCorpusReader(shards_root, shards=True).docs()) == list(pickled_reader.docs()))
+
+print()
+print()
+
+print('Абзацы, прочитанные по одному кадру, совпадают с абзацами документов, прочитанных целиком')
+print(list(pickled_reader.paras()) == [para for doc in pickled_reader.docs() for para in doc])
+print([list(doc) for doc in pickled_reader.docs(stream=True)] == list(pickled_reader.docs()))
+
+print('Обрезанный файл документа читается с ошибкой, а не как документ из части абзацев')
+truncated_root = tempfile.mkdtemp()
+shutil.copytree(os.path.join(CORPUS_PREPROC_ROOT, 'Category 1'), os.path.join(truncated_root, 'Category 1'))
+truncated_reader = PickledCorpusReader(truncated_root)
+path = truncated_reader.abspath('Category 1/document2.pickle')
+offsets = read_index(path)['offsets']
+# По границе кадра (без последнего абзаца и завершающего кадра) и посреди кадра
+for size in (offsets[-2], offsets[-2] + 10):
+    with open(path, 'r+b') as f:
+        f.truncate(size)
+    for stream in (False, True):
+        try:
+            [list(doc) for doc in truncated_reader.docs('Category 1/document2.pickle', stream=stream)]
+            print('Ошибки нет')
+        except ValueError as e:
+            print('stream={}: {}'.format(stream, e))
@@ -1,11 +1,122 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import multiprocessing
+import os
+import shutil
+import tempfile
+from classes.Instrumentation import Instrumentation
 from classes.Preprocessor import Preprocessor
 from classes.CustomCorpusReader import HTMLCorpusReader
+from classes.PickledCorpusReader import PickledCorpusReader
 from config import CORPUS_ROOT, CORPUS_PREPROC_ROOT
 
 corpus = HTMLCorpusReader(CORPUS_ROOT)
-preprocessor = Preprocessor(corpus, CORPUS_PREPROC_ROOT)
+preprocessor = Preprocessor(corpus, CORPUS_PREPROC_ROOT, incremental=False)
+
+# Замеры по этапам чтения и время обработки каждого документа
+corpus.instrument = preprocessor.instrument = Instrumentation(slowest=3)
 for transform in preprocessor.transform():
     print(transform)
+
+print(corpus.instrument.to_json())
+
+# Самые медленные документы считаются и без препроцессора - при чтении корпуса
+reader = HTMLCorpusReader(CORPUS_ROOT)
+reader.instrument = Instrumentation(slowest=3)
+for para in reader.paras():
+    pass
+print(reader.instrument.as_dict()['slowest'])
+print('Пустой выбор с замерами остается пустым:', list(reader.paras(fileids=[])))
+
+# Отчет прогона: разделенные на части файлы и выбросы по размеру и времени
+print(preprocessor.report)
+
+
+
+class BrokenCorpusReader(HTMLCorpusReader):
+
+    """Исходный корпус, в котором не извлекаются абзацы файла broken"""
+
+    broken = None
+
+    def paras(self, fileids=None, categories=None):
+        if fileids == self.broken:
+            raise ValueError("Абзацы {} не извлекаются".format(fileids))
+        return super().paras(fileids, categories)
+
+
+class BrokenPreprocessor(Preprocessor):
+
+    """Препроцессор, в котором не размечается часть, содержащая абзац broken_para"""
+
+    broken_para = None
+
+    def tag_segment(self, paras):
+        if self.broken_para in paras:
+            raise ValueError("Часть не размечается")
+        return super().tag_segment(paras)
+
+
+# Файл, размеченный частями в пуле и собранный обратно, совпадает с размеченным целиком.
+# Берем документ с наибольшим числом абзацев, чтобы частей было несколько
+fileid = max(corpus.fileids(), key=lambda fileid: len(list(corpus.paras(fileids=fileid))))
+whole, parts = tempfile.mkdtemp(), tempfile.mkdtemp()
+list(Preprocessor(corpus, whole, incremental=False).transform(fileid))
+splitter = Preprocessor(corpus, parts, n_jobs=2, split_size=0, segment_paras=2, incremental=False)
+list(splitter.transform(fileid))
+print('Разделен:', splitter.report['split'])
+target = preprocessor.target_fileid(fileid)
+print('Совпадает с целым:', list(PickledCorpusReader(whole).docs(target)) == list(PickledCorpusReader(parts).docs(target)))
+
+# Ошибка в средней части и ошибка извлечения первой части: файл попадает в ошибки, временных и
+# наполовину записанных файлов не остается, остальные файлы обрабатываются
+broken_corpus = BrokenCorpusReader(CORPUS_ROOT)
+broken_corpus.broken = [other for other in corpus.fileids() if other != fileid][0]
+failing = BrokenPreprocessor(broken_corpus, tempfile.mkdtemp(), n_jobs=2, split_size=0, segment_paras=2,
+                             ordered=False, incremental=False)
+failing.broken_para = list(corpus.paras(fileids=fileid))[2]
+print('Обработаны:', sorted(os.path.relpath(path, failing.target) for path in failing.transform()))
+print('Ошибки:', failing.errors)
+broken_names = tuple(os.path.splitext(os.path.basename(name))[0] for name in (fileid, broken_corpus.broken))
+print('Файлы ошибочных документов:', [
+    name for _, _, names in os.walk(failing.target) for name in names if name.lstrip('.').startswith(broken_names)
+])
+
+# Инкрементальная обработка по манифесту на копии корпуса (исходные файлы в ней меняются)
+source = os.path.join(tempfile.mkdtemp(), 'corpus')
+shutil.copytree(CORPUS_ROOT, source)
+source_corpus = HTMLCorpusReader(source)
+incremental = Preprocessor(source_corpus, tempfile.mkdtemp())
+
+print('Повторяющийся файл обрабатывается один раз:', len(list(incremental.transform([fileid, fileid]))))
+list(incremental.transform())
+list(incremental.transform())
+print('Второй прогон пропускает все файлы:', incremental.skipped == source_corpus.fileids())
+
+# Смена mtime без изменения содержимого не требует обработки (хеш тот же), изменение содержимого - требует
+changed, touched = source_corpus.fileids()[:2]
+os.utime(source_corpus.abspath(touched))
+with open(source_corpus.abspath(changed), 'a', encoding='utf-8') as f:
+    f.write('<p>Новый абзац.</p>')
+list(incremental.transform())
+print('Обработан заново только измененный:', sorted(set(source_corpus.fileids()) - set(incremental.skipped)))
+
+
+def interrupted_run():
+    """Прогон, который обрывается (без сохранения манифеста) сразу после первого обработанного файла"""
+
+    for _ in Preprocessor(source_corpus, resumed_target).transform():
+        os._exit(0)
+
+
+# Прерванный прогон: отметки в журнале manifest.log позволяют продолжить с места остановки
+resumed_target = tempfile.mkdtemp()
+process = multiprocessing.get_context('fork').Process(target=interrupted_run)
+process.start()
+process.join()
+print('После обрыва есть журнал и нет снимка:', sorted(os.listdir(resumed_target)))
+resumed = Preprocessor(source_corpus, resumed_target)
+list(resumed.transform())
+print('Продолжение пропускает обработанный до обрыва файл:', resumed.skipped)
+print('После прогона журнал свернут в снимок:', sorted(os.listdir(resumed_target)))
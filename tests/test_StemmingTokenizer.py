@@ -0,0 +1,35 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import string
+import nltk
+from classes.StemmingTokenizer import StemmingTokenizer
+
+texts = [
+    "Идеально для оладий подходят молоденькие кабачки и цуккини. Для жарки кабачков используем масло и гриль.",
+    "В сковороду выложить фарш и обжарить на среднем огне, до готовности, постоянно разминая деревянной лопаткой, "
+    "чтобы разбить крупные комки.",
+    "Вкусный и полезный ужин из запеченных кабачков с фаршем, помидорами и сыром, любителям жаркого!",
+]
+
+
+def reference_tokenize(text):
+    """
+    Прежняя лексемизация из BagOfWords: новый стеммер на каждый документ, без кеша.
+
+    Знаки препинания она отсеивала проверкой подстроки в string.punctuation, поэтому отбрасывала и
+    многосимвольные лексемы вроде '()' - в текстах выше таких нет.
+    """
+
+    stem = nltk.stem.SnowballStemmer('russian')
+    return [stem.stem(token) for token in nltk.word_tokenize(text.lower()) if token not in string.punctuation]
+
+
+expected = [reference_tokenize(text) for text in texts]
+tokenizer = StemmingTokenizer('russian')
+
+print('Последовательно совпадает с прежней лексемизацией:', list(tokenizer.tokenize_many(texts)) == expected)
+print('Повторно, основы из кеша:', list(tokenizer.tokenize_many(texts)) == expected, tokenizer.cache.info())
+print('В пуле процессов:', list(StemmingTokenizer('russian').tokenize_many(texts, n_jobs=2, chunksize=1)) == expected)
+print('Уже выделенные лексемы:',
+      [tokenizer.tokenize_document(nltk.word_tokenize(text)) for text in texts] == expected)
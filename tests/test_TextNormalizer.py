@@ -15,3 +15,13 @@ print('Normalization ... ')
 normalized_texts = text_normalizer.transform(texts)
 for normalized_text in normalized_texts:
     print(normalized_text)
+
+print('Кеш нормализации', text_normalizer.cache_info())
+
+# Параллельная и ленивая нормализация дают тот же результат, что и последовательная со списком
+sequential = TextNormalizer(lazy=False).transform(pickled_reader.docs())
+lazy = TextNormalizer().transform(pickled_reader.docs())
+parallel = TextNormalizer(n_jobs=2, chunksize=1).transform(pickled_reader.docs())
+print('Список при lazy=False:', isinstance(sequential, list), 'генератор при lazy=True:', not isinstance(lazy, list))
+print('Ленивая совпадает с последовательной:', list(lazy) == sequential)
+print('Параллельная совпадает с последовательной:', list(parallel) == sequential)
@@ -0,0 +1,51 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from math import log
+from nltk.text import TextCollection
+from classes.TfidfIndex import TfidfIndex
+
+corpus = [
+    ['кабачк', 'для', 'оладь', 'кабачк', 'и', 'цуккин'],
+    ['фарш', 'обжар', 'на', 'огн', 'и', 'размина', 'фарш'],
+    [],
+    ['ужин', 'из', 'кабачк', 'с', 'фарш', 'и', 'сыр'],
+]
+collection = TextCollection(corpus)
+n_docs = len(corpus)
+
+
+def df(term):
+    return sum(1 for document in corpus if term in document)
+
+
+# Оценки TextCollection и те же оценки с логарифмической частотой слова и сглаженной обратной частотой
+expected = {
+    (False, False): lambda term, document: collection.tf_idf(term, document),
+    (True, False): lambda term, document: (1 + log(document.count(term))) * collection.idf(term),
+    (False, True): lambda term, document: collection.tf(term, document) * log(1 + n_docs / df(term)),
+    (True, True): lambda term, document: (1 + log(document.count(term))) * log(1 + n_docs / df(term)),
+}
+
+for (sublinear_tf, smooth_idf), score in expected.items():
+    index = TfidfIndex(sublinear_tf=sublinear_tf, smooth_idf=smooth_idf)
+    matrix = index.fit_transform(corpus)
+
+    same = True
+    for i, document in enumerate(corpus):
+        row = dict(zip(matrix[i].indices, matrix[i].data))
+        # У пустого документа нет ненулевых оценок (TextCollection.tf на нем делит на ноль)
+        if set(row) != {index.vocabulary_[term] for term in document}:
+            same = False
+        for term in set(document):
+            if abs(row[index.vocabulary_[term]] - score(term, document)) > 1e-12:
+                same = False
+
+    print('sublinear_tf={}, smooth_idf={}: совпадает с NLTK - {}'.format(sublinear_tf, smooth_idf, same))
+
+print('Пустая строка матрицы у пустого документа:', TfidfIndex().fit_transform(corpus)[2].nnz == 0)
+
+# Обученный словарь применяется к новому документу: незнакомые слова отброшены, но входят в длину
+index = TfidfIndex().fit(corpus)
+row = index.transform([['кабачк', 'баклажан']])
+print('Новый документ:', row.toarray()[0][index.vocabulary_['кабачк']] == collection.idf('кабачк') / 2)